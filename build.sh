@@ -24,4 +24,10 @@ cp -v dist/pack_* debian/usr/local/bin
 
 VERSION="$(grep Version: debian/DEBIAN/control | cut -d' ' -f2)"
 
-dpkg-deb -Zxz --root-owner-group --build debian "dist/packaging-tools_$VERSION-1_all.deb"
+# Compression of the package can be set with the COMPRESSION (xz, zstd, gzip or none), COMPRESSION_LEVEL
+# and COMPRESSION_THREADS environment variables, using all CPU cores by default
+COMPRESSION="${COMPRESSION:-xz}"
+export DPKG_DEB_THREADS_MAX="${COMPRESSION_THREADS:-$(nproc)}"
+
+dpkg-deb -Z"$COMPRESSION" ${COMPRESSION_LEVEL:+-z"$COMPRESSION_LEVEL"} --root-owner-group --build debian \
+  "dist/packaging-tools_$VERSION-1_all.deb"
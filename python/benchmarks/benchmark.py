@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, Namespace
+from dataclasses import dataclass, asdict, replace
+from os.path import abspath, dirname, exists
+from tempfile import TemporaryDirectory
+from typing import Any, Optional
+
+SCRIPTS_DIR = dirname(dirname(abspath(__file__)))
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+from pack_cache import get_tool_version  # noqa: E402
+from pack_report import read_report  # noqa: E402
+from pack_watch import remove_build_outputs  # noqa: E402
+
+# Small pure Python distributions, so dh-virtualenv builds stay reasonably fast
+DEPENDENCIES = ['six', 'idna', 'attrs', 'packaging', 'pyparsing', 'certifi', 'chardet', 'toml', 'wrapt', 'decorator']
+
+MODES = ['script', 'cache', 'parallel', 'delta']
+# Scripts producing .deb packages, the delta mode measures the delta between two of their versions
+DELTA_SCRIPTS = ['fpm-deb', 'dh-virtualenv']
+
+
+@dataclass
+class Project:
+    name: str
+    modules: int
+    data_mb: float
+    dependencies: int
+    entry_points: int
+
+
+PROJECTS = {
+    'small': Project('small', modules=10, data_mb=0.1, dependencies=0, entry_points=1),
+    'medium': Project('medium', modules=200, data_mb=10, dependencies=2, entry_points=5),
+    'large': Project('large', modules=2000, data_mb=200, dependencies=5, entry_points=20),
+}
+
+
+def main() -> None:
+    arguments = _get_arguments()
+
+    projects = [_get_project(arguments, name) for name in arguments.projects.split()]
+
+    results: dict[str, Any] = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'host': {'machine': platform.machine(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+        'tools': [get_tool_version(tuple(command)) for command in
+                  [[arguments.python_bin, '--version'], ['fpm', '--version'], ['dpkg', '--version'],
+                   ['dh_virtualenv', '--version']]],
+        'projects': [asdict(project) for project in projects],
+        'runs': [],
+    }
+
+    with TemporaryDirectory(prefix='pack-benchmark-', dir=arguments.work_dir) as work_dir:
+        for project in projects:
+            workspace_dir = f'{work_dir}/{project.name}'
+            generate_project(workspace_dir, project)
+
+            for mode in arguments.modes.split():
+                for script in _get_scripts(arguments, mode):
+                    for repeat in range(arguments.repeat):
+                        run = _run_benchmark(arguments, workspace_dir, work_dir, mode, script)
+                        run.update({'project': project.name, 'mode': mode, 'script': script, 'repeat': repeat})
+                        results['runs'].append(run)
+                        _print_run(run)
+
+    results['summary'] = summarize(results['runs'])
+
+    with open(arguments.output, 'w') as file:
+        json.dump(results, file, indent=2)
+        file.write('\n')
+
+    print(f'Results written to {arguments.output}', file=sys.stderr)
+
+    if arguments.baseline:
+        exit(compare(results['summary'], summarize_file(arguments.baseline), arguments.threshold))
+
+
+def generate_project(workspace_dir: str, project: Project) -> None:
+    """Generates a Python project with the given number of modules, data volume, dependencies and entry points.
+
+    The content is generated from a fixed seed, so the projects are identical between benchmark runs.
+    """
+    rng = random.Random(project.name)
+    package = f'bench_{project.name}'
+    package_dir = f'{workspace_dir}/{package}'
+
+    shutil.rmtree(workspace_dir, ignore_errors=True)
+    os.makedirs(f'{package_dir}/data')
+
+    _write(f'{package_dir}/__init__.py', '')
+
+    for index in range(project.modules):
+        functions = '\n\n'.join(f'def function_{index}_{number}(value):\n    return value * {rng.randint(1, 1000)}\n'
+                                for number in range(10))
+        _write(f'{package_dir}/module_{index}.py', f'"""Generated module {index}."""\n\n\n{functions}')
+
+    data_size = int(project.data_mb * 1024 * 1024)
+    file_size = min(data_size, 1024 * 1024) or 1
+
+    for index in range(data_size // file_size):
+        with open(f'{package_dir}/data/file_{index}.bin', 'wb') as file:
+            # Half of the data is compressible text, half is random
+            if index % 2:
+                file.write(rng.randbytes(file_size))
+            else:
+                file.write((f'line {index} of generated data\n' * file_size)[:file_size].encode())
+
+    for index in range(project.entry_points):
+        _write(f'{package_dir}/entry_{index}.py', 'def main():\n    print("Hello")\n')
+
+    entry_points = ', '.join(f'"bench-{project.name}-{index}={package}.entry_{index}:main"'
+                             for index in range(project.entry_points))
+    requirements = ', '.join(f'"{dependency}"' for dependency in DEPENDENCIES[:project.dependencies])
+
+    _write(f'{workspace_dir}/setup.py', f'''from setuptools import setup
+
+setup(
+    name="bench-{project.name}",
+    version="1.0.0",
+    description="Generated benchmark project",
+    author="Benchmark",
+    author_email="benchmark@example.com",
+    packages=["{package}"],
+    package_data={{"{package}": ["data/*"]}},
+    install_requires=[{requirements}],
+    entry_points={{"console_scripts": [{entry_points}]}},
+)
+''')
+
+    _write(f'{workspace_dir}/setup.cfg', '[pack-python]\npackaging = wheel fpm-deb dh-virtualenv\n')
+
+
+def summarize(runs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    groups: dict[tuple[str, str, str], list[dict[str, Any]]] = {}
+
+    for run in runs:
+        groups.setdefault((run['project'], run['mode'], run['script']), []).append(run)
+
+    summary = []
+
+    for (project, mode, script), group in groups.items():
+        succeeded = [run for run in group if not run['returncode']]
+        summary.append({
+            'project': project,
+            'mode': mode,
+            'script': script,
+            'runs': len(group),
+            'failures': len(group) - len(succeeded),
+            'wall_time': _median(succeeded, 'wall_time'),
+            'peak_rss_kb': _median(succeeded, 'peak_rss_kb'),
+            'artifact_bytes': _median(succeeded, 'artifact_bytes'),
+        })
+
+    return summary
+
+
+def summarize_file(results_file: str) -> list[dict[str, Any]]:
+    with open(results_file, 'r') as file:
+        summary: list[dict[str, Any]] = json.load(file)['summary']
+        return summary
+
+
+def compare(summary: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float) -> int:
+    """Prints the ratio of the results to the baseline and returns 1 if any metric regressed over the threshold."""
+    baseline_results = {(result['project'], result['mode'], result['script']): result for result in baseline}
+    regressed = False
+
+    for result in summary:
+        if not (base := baseline_results.get((result['project'], result['mode'], result['script']))):
+            continue
+
+        for metric in ['wall_time', 'peak_rss_kb', 'artifact_bytes']:
+            if not base[metric] or result[metric] is None:
+                continue
+
+            ratio = result[metric] / base[metric]
+            marker = ' REGRESSION' if ratio > threshold else ''
+            regressed = regressed or bool(marker)
+
+            print(f'{result["project"]:<8} {result["mode"]:<9} {result["script"]:<14} {metric:<15} '
+                  f'{base[metric]:>12.6g} -> {result[metric]:>12.6g} ({ratio:.2f}x){marker}')
+
+    return 1 if regressed else 0
+
+
+def _run_benchmark(arguments: Namespace, workspace_dir: str, work_dir: str, mode: str, script: str) -> dict[str, Any]:
+    output_dir = f'{work_dir}/output'
+    report_file = f'{work_dir}/report.json'
+    cache_dir = f'{work_dir}/cache'
+
+    if mode == 'delta':
+        return _run_delta_benchmark(arguments, workspace_dir, work_dir, script)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    # Every repeat is a cold build, setuptools would reuse the build directory of the previous run
+    remove_build_outputs(workspace_dir)
+
+    if mode == 'script':
+        command = [f'{SCRIPTS_DIR}/pack_{script}', workspace_dir]
+    elif mode == 'cache':
+        command = [f'{SCRIPTS_DIR}/pack_python', workspace_dir, '-s', script, '--cache-dir', cache_dir]
+        # The first run populates the cache, the measured run restores from it
+        _run([*command, '-o', output_dir, '-p', arguments.python_bin], arguments.log_file)
+        shutil.rmtree(output_dir, ignore_errors=True)
+    else:
+        command = [f'{SCRIPTS_DIR}/pack_python', workspace_dir, '--all', '--no-cache', '-j', str(arguments.jobs)]
+
+    start = time.perf_counter()
+    returncode = _run([*command, '-o', output_dir, '-p', arguments.python_bin, '-r', report_file], arguments.log_file)
+    wall_time = time.perf_counter() - start
+
+    report = read_report(report_file) if exists(report_file) else None
+
+    if exists(report_file):
+        os.remove(report_file)
+
+    return {
+        'returncode': returncode,
+        'wall_time': round(wall_time, 3),
+        'cpu_time': report['cpu_time'] if report else None,
+        'peak_rss_kb': report['peak_rss_kb'] if report else None,
+        'artifact_bytes': sum(artifact['size'] for artifact in report['artifacts']) if report else None,
+    }
+
+
+def _run_delta_benchmark(arguments: Namespace, workspace_dir: str, work_dir: str, script: str) -> dict[str, Any]:
+    """Packages the project, then a new version with one module changed, and measures applying their delta."""
+    delta_dir = f'{work_dir}/delta'
+    report_file = f'{work_dir}/report.json'
+    changed_files = [f'{workspace_dir}/setup.py', glob.glob(f'{workspace_dir}/*/module_0.py')[0]]
+    originals = {}
+
+    shutil.rmtree(delta_dir, ignore_errors=True)
+
+    for path in changed_files:
+        with open(path) as file:
+            originals[path] = file.read()
+
+    try:
+        command = [f'{SCRIPTS_DIR}/pack_{script}', workspace_dir, '-p', arguments.python_bin]
+        returncode = _run([*command, '-o', f'{delta_dir}/old'], arguments.log_file)
+
+        _write(changed_files[0], originals[changed_files[0]].replace('version="1.0.0"', 'version="1.0.1"'))
+        _write(changed_files[1], originals[changed_files[1]] + '\n\ndef changed():\n    return 1\n')
+        returncode = returncode or _run([*command, '-o', f'{delta_dir}/new'], arguments.log_file)
+    finally:
+        for path, content in originals.items():
+            _write(path, content)
+
+    if returncode:
+        return {'returncode': returncode, 'wall_time': 0, 'create_time': None, 'cpu_time': None,
+                'peak_rss_kb': None, 'artifact_bytes': None, 'package_bytes': None}
+
+    old_deb, new_deb = [glob.glob(f'{delta_dir}/{version}/*.deb')[0] for version in ['old', 'new']]
+    delta_script = f'{SCRIPTS_DIR}/pack_deb-delta'
+
+    start = time.perf_counter()
+    returncode = _run([delta_script, 'create', old_deb, new_deb, '-o', delta_dir], arguments.log_file)
+    create_time = time.perf_counter() - start
+    delta_file = next(iter(glob.glob(f'{delta_dir}/*.debdelta')), '')
+
+    start = time.perf_counter()
+    returncode = returncode or _run([delta_script, '-r', report_file, 'apply', old_deb, delta_file,
+                                     '-o', f'{delta_dir}/applied'], arguments.log_file)
+    wall_time = time.perf_counter() - start
+
+    report = read_report(report_file) if exists(report_file) else None
+
+    if exists(report_file):
+        os.remove(report_file)
+
+    return {
+        'returncode': returncode,
+        'wall_time': round(wall_time, 3),
+        'create_time': round(create_time, 3),
+        'cpu_time': report['cpu_time'] if report else None,
+        'peak_rss_kb': report['peak_rss_kb'] if report else None,
+        'artifact_bytes': os.path.getsize(delta_file) if delta_file else None,
+        'package_bytes': os.path.getsize(new_deb),
+    }
+
+
+def _get_scripts(arguments: Namespace, mode: str) -> list[str]:
+    if mode == 'parallel':
+        return ['all']
+
+    scripts: list[str] = arguments.scripts.split()
+
+    return [script for script in scripts if script in DELTA_SCRIPTS] if mode == 'delta' else scripts
+
+
+def _run(command: list[str], log_file: Optional[str]) -> int:
+    with open(log_file or os.devnull, 'a') as log:
+        return subprocess.run(command, stdout=subprocess.DEVNULL, stderr=log).returncode
+
+
+def _print_run(run: dict[str, Any]) -> None:
+    status = 'ok' if not run['returncode'] else f'failed ({run["returncode"]})'
+    print(f'{run["project"]:<8} {run["mode"]:<9} {run["script"]:<14} #{run["repeat"]} {status:<11} '
+          f'{run["wall_time"]:>8.2f}s {run["peak_rss_kb"] or 0:>9} KiB {run["artifact_bytes"] or 0:>12} B',
+          file=sys.stderr)
+
+
+def _median(runs: list[dict[str, Any]], metric: str) -> Optional[float]:
+    values = [run[metric] for run in runs if run[metric] is not None]
+    return statistics.median(values) if values else None
+
+
+def _get_project(arguments: Namespace, name: str) -> Project:
+    if name not in PROJECTS:
+        print(f'Unknown project size {name}, expected one of {", ".join(PROJECTS)}', file=sys.stderr)
+        exit(2)
+
+    overrides = {field: value for field in ['modules', 'data_mb', 'dependencies', 'entry_points']
+                 if (value := getattr(arguments, field)) is not None}
+
+    return replace(PROJECTS[name], **overrides)
+
+
+def _write(path: str, content: str) -> None:
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+def _get_arguments() -> Namespace:
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-o', '--output', help='benchmark results file', default='benchmark.json')
+    parser.add_argument('-b', '--baseline', help='results file to compare with, fails on regressions')
+    parser.add_argument('-t', '--threshold', help='maximum allowed ratio to the baseline', type=float, default=1.2)
+    parser.add_argument('--projects', help='space separated project sizes to generate', default='small medium')
+    parser.add_argument('--modules', help='override the number of modules of the projects', type=int)
+    parser.add_argument('--data-mb', help='override the data file volume of the projects in MiB', type=float)
+    parser.add_argument('--dependencies', help='override the number of dependencies of the projects', type=int)
+    parser.add_argument('--entry-points', help='override the number of entry points of the projects', type=int)
+    parser.add_argument('-s', '--scripts', help='space separated packaging scripts to benchmark',
+                        default='wheel fpm-deb dh-virtualenv')
+    parser.add_argument('-m', '--modes', help=f'space separated benchmark modes ({", ".join(MODES)})',
+                        default=' '.join(MODES))
+    parser.add_argument('-n', '--repeat', help='number of runs of each benchmark', type=int, default=3)
+    parser.add_argument('-j', '--jobs', help='number of parallel jobs of the parallel mode', type=int, default=3)
+    parser.add_argument('-p', '--python-bin', help='python executable to use', default='python3')
+    parser.add_argument('-w', '--work-dir', help='directory of the generated projects')
+    parser.add_argument('-l', '--log-file', help='append the output of the packaging scripts to this file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from os.path import dirname, join, relpath
+from typing import Any, Generator, Optional
+
+from pack_deb import parse_control, read_control
+
+CACHE_FILE = '.pack_apt-repo.json'
+CACHE_VERSION = 1
+LOCK_FILE = '.pack_apt-repo.lock'
+
+INDEX_FILES = ['Packages', 'Packages.gz']
+CHECKSUMS = {'MD5Sum': 'md5', 'SHA1': 'sha1', 'SHA256': 'sha256'}
+
+# Field order of the Packages index used by dpkg-scanpackages, other fields follow in their original order
+PACKAGES_FIELD_ORDER = [
+    'Package', 'Package-Type', 'Source', 'Version', 'Kernel-Version', 'Built-For-Profiles', 'Auto-Built-Package',
+    'Architecture', 'Subarchitecture', 'Installer-Menu-Item', 'Build-Essential', 'Essential', 'Protected', 'Origin',
+    'Bugs', 'Maintainer', 'Installed-Size', 'Pre-Depends', 'Depends', 'Recommends', 'Suggests', 'Enhances',
+    'Conflicts', 'Breaks', 'Replaces', 'Provides', 'Built-Using', 'Static-Built-Using', 'Filename', 'Size', 'MD5sum',
+    'SHA1', 'SHA256', 'Section', 'Priority', 'Multi-Arch', 'Homepage', 'Description', 'Tag', 'Task',
+]
+
+
+class AptRepository:
+    """Flat APT repository index of the .deb files in a directory, usable with deb [trusted=yes] file:/dir ./
+
+    The control stanza and checksums of each package are cached by (path, size, mtime),
+    so updating the index only reads the packages added or changed since the last update.
+    """
+
+    def __init__(self, repo_dir: str, release_fields: Optional[dict[str, str]] = None) -> None:
+        self.repo_dir = repo_dir
+        self.release_fields = release_fields or {}
+        self.cache_file = join(repo_dir, CACHE_FILE)
+
+    def update(self) -> bool:
+        """Updates the index files, returns False if they were already up to date."""
+        # Concurrent builds publishing to the same repository update the index one at a time
+        with self._lock():
+            return self._update()
+
+    def _update(self) -> bool:
+        cached = self._load_cache()
+        packages: dict[str, dict[str, Any]] = {}
+        scanned = 0
+
+        for path, stat in self._find_packages():
+            entry = cached.get(path)
+
+            if not entry or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+                entry = _scan_package(join(self.repo_dir, path), stat)
+                scanned += 1
+
+            packages[path] = entry
+
+        content = format_packages(packages).encode()
+
+        if scanned == 0 and packages.keys() == cached.keys() and self._is_index_current(content):
+            return False
+
+        print(f'Indexed {scanned} new or changed of {len(packages)} packages in {self.repo_dir}', file=sys.stderr)
+
+        _write_file(join(self.repo_dir, 'Packages'), content)
+        _write_file(join(self.repo_dir, 'Packages.gz'), gzip.compress(content, mtime=0))
+        _write_file(join(self.repo_dir, 'Release'), self._format_release(packages).encode())
+
+        self._save_cache(packages)
+
+        return True
+
+    def get_index_files(self) -> list[str]:
+        return [join(self.repo_dir, name) for name in [*INDEX_FILES, 'Release']]
+
+    @contextmanager
+    def _lock(self) -> Generator[None, None, None]:
+        with open(join(self.repo_dir, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _find_packages(self) -> list[tuple[str, os.stat_result]]:
+        packages = []
+
+        for root, dirs, files in os.walk(self.repo_dir):
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+
+            for name in sorted(files):
+                if name.endswith('.deb'):
+                    path = join(root, name)
+                    packages.append((relpath(path, self.repo_dir), os.stat(path)))
+
+        return packages
+
+    def _is_index_current(self, content: bytes) -> bool:
+        try:
+            with open(join(self.repo_dir, 'Packages'), 'rb') as file:
+                return file.read() == content and all(os.path.exists(file) for file in self.get_index_files())
+        except OSError:
+            return False
+
+    def _format_release(self, packages: dict[str, dict[str, Any]]) -> str:
+        architectures = sorted({entry['control'].get('Architecture', 'all').strip() for entry in packages.values()})
+
+        fields = {
+            **self.release_fields,
+            'Date': time.strftime('%a, %d %b %Y %H:%M:%S UTC', time.gmtime()),
+            'Architectures': ' '.join(architectures),
+        }
+
+        lines = [f'{name}: {value}' for name, value in fields.items()]
+
+        for field, algorithm in CHECKSUMS.items():
+            lines.append(f'{field}:')
+
+            for name in INDEX_FILES:
+                with open(join(self.repo_dir, name), 'rb') as file:
+                    content = file.read()
+
+                lines.append(f' {hashlib.new(algorithm, content).hexdigest()} {len(content):>16} {name}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _load_cache(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self.cache_file, 'r') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        if cache.get('version') != CACHE_VERSION:
+            return {}
+
+        packages: dict[str, dict[str, Any]] = cache['packages']
+        return packages
+
+    def _save_cache(self, packages: dict[str, dict[str, Any]]) -> None:
+        # Keys are not sorted, as the order of the control fields is kept
+        content = json.dumps({'version': CACHE_VERSION, 'packages': packages})
+        _write_file(self.cache_file, content.encode())
+
+
+def format_packages(packages: dict[str, dict[str, Any]]) -> str:
+    content = ''
+
+    def sort_key(item: tuple[str, dict[str, Any]]) -> tuple[str, str, str]:
+        path, entry = item
+        return entry['control'].get('Package', ''), entry['control'].get('Version', ''), path
+
+    for path, entry in sorted(packages.items(), key=sort_key):
+        content += f'{format_stanza(path, entry)}\n'
+
+    return content
+
+
+def format_stanza(path: str, entry: dict[str, Any]) -> str:
+    """Formats the control fields of the package with the file fields, in the field order of dpkg-scanpackages."""
+    fields: dict[str, str] = dict(entry['control'])
+
+    fields['Filename'] = f' ./{path}'
+    fields['Size'] = f' {entry["size"]}'
+
+    for field, algorithm in CHECKSUMS.items():
+        fields[field if field != 'MD5Sum' else 'MD5sum'] = f' {entry[algorithm]}'
+
+    order = {name.lower(): index for index, name in enumerate(PACKAGES_FIELD_ORDER)}
+    names = sorted(fields, key=lambda name: order.get(name.lower(), len(order)))
+
+    return ''.join(f'{name}:{fields[name]}\n' for name in names)
+
+
+def _scan_package(deb_file: str, stat: os.stat_result) -> dict[str, Any]:
+    digests = {algorithm: hashlib.new(algorithm) for algorithm in CHECKSUMS.values()}
+
+    with open(deb_file, 'rb') as file:
+        while chunk := file.read(1024 * 1024):
+            for digest in digests.values():
+                digest.update(chunk)
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'control': parse_control(read_control(deb_file)),
+        **{algorithm: digest.hexdigest() for algorithm, digest in digests.items()},
+    }
+
+
+def _write_file(path: str, content: bytes) -> None:
+    fd, temp_file = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=dirname(path))
+
+    try:
+        # The index is read by apt, not only by the user updating it
+        os.fchmod(fd, 0o644)
+
+        with open(fd, 'wb') as file:
+            file.write(content)
+
+        os.replace(temp_file, path)
+    except BaseException:
+        os.remove(temp_file)
+        raise
@@ -0,0 +1,249 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+from dataclasses import dataclass
+from os.path import abspath, basename, exists, isdir, join
+from tempfile import TemporaryDirectory, mkstemp
+from typing import Generator, Optional
+
+from pack_common import CACHE_ROOT
+
+DEFAULT_STORE_DIR = f'{CACHE_ROOT}/store'
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_SIZE_MB = 10240
+
+OBJECTS_DIR = 'objects'
+STAGING_PREFIX = '.pack-staging-'
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoreStatus:
+    objects: int
+    size: int
+    unreferenced: int
+    unreferenced_size: int
+
+
+class ArtifactStore:
+    """Content-addressed store of the packaged artifacts, shared by the output directories through hardlinks.
+
+    Objects are stored read-only under their SHA-256 hash, so identical artifacts built on different branches
+    or into different output directories take the disk space once. Output directories on another file system
+    get copies instead. The change time of an object is updated by linking and unlinking it, so it is used as
+    the last time the object was referenced for garbage collection.
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR) -> None:
+        self.store_dir = store_dir
+
+    def commit(self, artifact: str, output_dir: str) -> str:
+        """Moves the artifact into the store and links it into the output directory, returning the linked path."""
+        object_file = self.get_object_file(get_file_hash(artifact))
+
+        if exists(object_file):
+            os.remove(artifact)
+        else:
+            os.makedirs(os.path.dirname(object_file), exist_ok=True)
+            _move_file(artifact, object_file)
+            os.chmod(object_file, stat.S_IMODE(os.stat(object_file).st_mode) & ~0o222)
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        target = join(output_dir, basename(artifact))
+        link_file(object_file, target)
+
+        return target
+
+    def get_object_file(self, file_hash: str) -> str:
+        return join(self.store_dir, OBJECTS_DIR, file_hash[:2], file_hash)
+
+    def get_status(self) -> StoreStatus:
+        status = StoreStatus(0, 0, 0, 0)
+
+        for path, file_stat in self._list_objects():
+            status.objects += 1
+            status.size += file_stat.st_size
+
+            if file_stat.st_nlink == 1:
+                status.unreferenced += 1
+                status.unreferenced_size += file_stat.st_size
+
+        return status
+
+    def gc(self, max_age: float = DEFAULT_MAX_AGE_DAYS * 24 * 3600,
+           max_size: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024) -> list[str]:
+        """Removes the objects unreferenced for longer than max_age, then the least recently referenced objects
+        until the store fits into max_size. Unreferenced objects are removed first, as removing an object still
+        linked into an output directory does not free its disk space."""
+        objects = sorted(self._list_objects(), key=lambda entry: (entry[1].st_nlink > 1, entry[1].st_ctime))
+        size = sum(file_stat.st_size for _, file_stat in objects)
+        now = time.time()
+        removed: list[str] = []
+
+        for path, file_stat in objects:
+            expired = file_stat.st_nlink == 1 and now - file_stat.st_ctime > max_age
+
+            if expired or size > max_size:
+                os.remove(path)
+                size -= file_stat.st_size
+                removed.append(path)
+
+        # Leftovers of interrupted commits
+        for path, file_stat in self._list_objects(temporary=True):
+            if now - file_stat.st_mtime > max_age:
+                os.remove(path)
+
+        return removed
+
+    def _list_objects(self, temporary: bool = False) -> list[tuple[str, os.stat_result]]:
+        objects_dir = join(self.store_dir, OBJECTS_DIR)
+        objects: list[tuple[str, os.stat_result]] = []
+
+        if not isdir(objects_dir):
+            return objects
+
+        for prefix in os.scandir(objects_dir):
+            if prefix.is_dir():
+                for entry in os.scandir(prefix.path):
+                    if entry.is_file() and entry.name.startswith('.') == temporary:
+                        objects.append((entry.path, entry.stat()))
+
+        return objects
+
+
+def get_file_hash(file: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(file, 'rb') as data:
+        while chunk := data.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def link_file(source: str, target: str) -> None:
+    """Replaces the target with a hardlink of the source, or with a copy if they are on different file systems."""
+    temp_file = _get_temp_file(target)
+
+    try:
+        os.link(source, temp_file)
+    except OSError:
+        copy_file(source, target)
+        return
+
+    os.replace(temp_file, target)
+
+
+def copy_file(source: str, target: str) -> None:
+    """Replaces the target with a writable copy of the source."""
+    temp_file = _get_temp_file(target)
+
+    try:
+        shutil.copy2(source, temp_file)
+        os.chmod(temp_file, stat.S_IMODE(os.stat(temp_file).st_mode) | stat.S_IWUSR)
+        os.replace(temp_file, target)
+    finally:
+        if exists(temp_file):
+            os.remove(temp_file)
+
+
+def _get_temp_file(target: str) -> str:
+    return join(os.path.dirname(target), f'.{basename(target)}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def _move_file(source: str, target: str) -> None:
+    # Written to a temporary name first, so concurrent readers never see a partially copied file
+    fd, temp_file = mkstemp(prefix='.', dir=os.path.dirname(target))
+    os.close(fd)
+
+    try:
+        try:
+            os.replace(source, temp_file)
+        except OSError:
+            shutil.copy2(source, temp_file)
+            os.remove(source)
+
+        os.replace(temp_file, target)
+    finally:
+        if exists(temp_file):
+            os.remove(temp_file)
+
+
+@contextmanager
+def stage_output(output_dir: str, keep: bool = False) -> Generator[str, None, None]:
+    """Yields a staging directory in the output directory for the packaging tools to write their artifacts to.
+
+    The tools overwrite existing files in place, which would change the stored objects through the hardlinks
+    in the output directory, so the artifacts are written to the staging directory and committed from there.
+    With keep set, the files left in the staging directory, e.g. the source package and the build tree,
+    are moved into the output directory at the end, even if the build failed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    with TemporaryDirectory(prefix=STAGING_PREFIX, dir=output_dir) as staging_dir:
+        try:
+            yield staging_dir
+        finally:
+            if keep:
+                _move_entries(staging_dir, output_dir)
+
+
+def _move_entries(source_dir: str, target_dir: str) -> None:
+    for name in sorted(os.listdir(source_dir)):
+        source, target = join(source_dir, name), join(target_dir, name)
+
+        if isdir(source):
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(source, target)
+        else:
+            _move_file(source, target)
+
+
+def commit_artifacts(store: Optional[ArtifactStore], artifacts: list[str], output_dir: str) -> list[str]:
+    """Commits the staged artifacts into the store, or moves them into the output directory without a store."""
+    if store:
+        return [store.commit(artifact, output_dir) for artifact in artifacts]
+
+    targets = []
+
+    for artifact in artifacts:
+        target = join(output_dir, basename(artifact))
+        # Replacing instead of overwriting keeps an earlier hardlinked artifact and its stored object intact
+        _move_file(artifact, target)
+        targets.append(target)
+
+    return targets
+
+
+def add_store_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        '--store', help='commit the packages into the artifact store and hardlink them into the output directory',
+        action='store_true')
+    parser.add_argument('--store-dir', help='artifact store directory', default=DEFAULT_STORE_DIR)
+
+
+def get_store(arguments: Namespace) -> Optional[ArtifactStore]:
+    if not arguments.store:
+        return None
+
+    store_dir = abspath(arguments.store_dir)
+
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+    except OSError as error:
+        print(f'Failed to create artifact store {store_dir}: {error}', file=sys.stderr)
+        exit(1)
+
+    return ArtifactStore(store_dir)
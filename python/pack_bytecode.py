@@ -0,0 +1,213 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+from argparse import ArgumentParser
+from configparser import ConfigParser
+from dataclasses import asdict, dataclass
+from functools import partial
+from os.path import basename, dirname, isdir, join, normpath
+from tempfile import TemporaryDirectory
+from typing import IO, Optional
+
+from pack_common import run_command
+from pack_deb import DataEntry, iter_deb_members, open_tar_member
+from pack_report import Report
+
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+SITE_DIRS = ('site-packages', 'dist-packages')
+# Modules reported per entry point, the slowest ones by their own import time
+REPORTED_MODULES = 10
+
+
+@dataclass
+class ImportTime:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def add_bytecode_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        '--precompile', help='compile the Python modules into unchecked-hash .pyc files shipped in the package',
+        action='store_true')
+    parser.add_argument(
+        '--import-times', help='measure the import time of the entry point modules of the package per module',
+        action='store_true')
+
+
+def get_compile_command(python_bin: str, directory: str, root_dir: str) -> list[str]:
+    """Returns the command compiling the modules under the directory of the package root, recording their
+    installed paths. Unchecked-hash .pyc files do not depend on the time of the build, and are used without
+    comparing them with the source, so they stay valid with any file timestamps and on read-only file systems."""
+    return [python_bin, '-m', 'compileall', '-q', '-f', '-j', '0', '--invalidation-mode', 'unchecked-hash',
+            '-s', shlex.quote(root_dir), '-p', '/', shlex.quote(directory)]
+
+
+def compile_directory(python_bin: str, directory: str, root_dir: str, log_file: Optional[str] = None) -> None:
+    if isdir(directory):
+        list(run_command(root_dir, get_compile_command(python_bin, directory, root_dir), '(?!)', log_file=log_file))
+
+
+def compile_entries(entries: list[DataEntry], python_bin: str, lib_dir: str, work_dir: str,
+                    log_file: Optional[str] = None) -> list[DataEntry]:
+    """Compiles the modules of the package entries under the library directory in the work directory,
+    returning the entries of the compiled .pyc files. The work directory has to exist while the package is written."""
+    for entry in entries:
+        if entry.path.startswith(f'{lib_dir}/') and entry.path.endswith('.py'):
+            os.makedirs(dirname(path := f'{work_dir}{entry.path}'), exist_ok=True)
+
+            with entry.open() as source, open(path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+
+    compile_directory(python_bin, f'{work_dir}{lib_dir}', work_dir, log_file)
+
+    compiled = []
+
+    for root, _, names in os.walk(work_dir):
+        for name in names:
+            if name.endswith('.pyc'):
+                path = join(root, name)
+                compiled.append(DataEntry(path[len(work_dir):], os.path.getsize(path), partial(_open_file, path)))
+
+    return compiled
+
+
+def measure_import_times(deb_file: str, python_bin: str, project_name: Optional[str]) -> dict[str, list[ImportTime]]:
+    """Imports the entry point modules of the packaged project from the content of the package with
+    python -X importtime, returning the import time of each imported module per entry point module.
+
+    The modules are imported without writing bytecode, so the times are those of the first start on the device.
+    Modules of other packages are imported from the build host. Without entry points the top level modules are used.
+    """
+    import_times: dict[str, list[ImportTime]] = {}
+
+    with TemporaryDirectory(prefix='pack_bytecode-') as root_dir:
+        _extract_data(deb_file, root_dir)
+        site_dirs = _find_site_dirs(root_dir)
+
+        for module in _get_entry_modules(site_dirs, project_name):
+            import_times[module] = _measure_import(python_bin, module, site_dirs, root_dir)
+
+    return import_times
+
+
+def report_import_times(report: Report, packages: list[str], python_bin: str, project_name: Optional[str]) -> None:
+    for package in packages:
+        import_times = measure_import_times(package, python_bin, project_name)
+        print_import_times(import_times)
+        report.import_times.update({module: [asdict(time) for time in times] for module, times in import_times.items()})
+
+
+def print_import_times(import_times: dict[str, list[ImportTime]]) -> None:
+    for module, times in import_times.items():
+        total = next((time.cumulative_us for time in times if time.module == module), 0)
+        print(f'Import time of {module}: {total / 1000:.1f} ms, {len(times)} modules', file=sys.stderr)
+
+        for time in sorted(times, key=lambda time: time.self_us, reverse=True)[:REPORTED_MODULES]:
+            print(f'  {time.self_us / 1000:>8.1f} ms {time.module}', file=sys.stderr)
+
+
+def _measure_import(python_bin: str, module: str, site_dirs: list[str], root_dir: str) -> list[ImportTime]:
+    # The modules imported by the interpreter at startup are left out
+    startup = {time.module for time in _run_import(python_bin, 'pass', site_dirs, root_dir)}
+
+    return [time for time in _run_import(python_bin, f'import {module}', site_dirs, root_dir)
+            if time.module not in startup]
+
+
+def _run_import(python_bin: str, statement: str, site_dirs: list[str], root_dir: str) -> list[ImportTime]:
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(site_dirs), 'PYTHONDONTWRITEBYTECODE': '1'}
+
+    # Run in the package root, so the modules of the workspace are not imported instead
+    result = subprocess.run([python_bin, '-X', 'importtime', '-c', statement], cwd=root_dir, env=env,
+                            text=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    if result.returncode:
+        error = result.stderr.strip().splitlines()
+        print(f"Failed to run '{statement}' with the package: {error[-1] if error else result.returncode}",
+              file=sys.stderr)
+
+    import_times = []
+
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_PATTERN.match(line):
+            import_times.append(ImportTime(match.group(4), int(match.group(1)), int(match.group(2)),
+                                           len(match.group(3)) // 2))
+
+    return import_times
+
+
+def _extract_data(deb_file: str, root_dir: str) -> None:
+    # Only the regular files are extracted, the links of virtualenvs point to the interpreter of the device
+    with open(deb_file, 'rb') as file:
+        for name, member in iter_deb_members(file, deb_file):
+            if not name.startswith('data.tar'):
+                continue
+
+            with open_tar_member(member, name) as tar:
+                for info in tar:
+                    path = normpath(join(root_dir, info.name.lstrip('/')))
+
+                    if not info.isreg() or not path.startswith(f'{root_dir}/') or not (source := tar.extractfile(info)):
+                        continue
+
+                    os.makedirs(dirname(path), exist_ok=True)
+
+                    with source, open(path, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+
+
+def _find_site_dirs(root_dir: str) -> list[str]:
+    site_dirs = []
+
+    for root, directories, _ in os.walk(root_dir):
+        for directory in directories:
+            if directory in SITE_DIRS:
+                site_dirs.append(join(root, directory))
+
+    return sorted(site_dirs)
+
+
+def _get_entry_modules(site_dirs: list[str], project_name: Optional[str]) -> list[str]:
+    modules: list[str] = []
+
+    for dist_info in _find_dist_infos(site_dirs, project_name):
+        entry_points = ConfigParser(delimiters=('=',), interpolation=None)
+        entry_points.read(join(dist_info, 'entry_points.txt'))
+        entry_modules = [value.split(':')[0].strip() for group in ['console_scripts', 'gui_scripts']
+                         if entry_points.has_section(group) for _, value in entry_points.items(group)]
+
+        if not entry_modules and os.path.exists(top_level := join(dist_info, 'top_level.txt')):
+            with open(top_level, 'r') as file:
+                entry_modules = [line.strip() for line in file if line.strip()]
+
+        modules.extend(entry_modules)
+
+    return list(dict.fromkeys(modules))
+
+
+def _find_dist_infos(site_dirs: list[str], project_name: Optional[str]) -> list[str]:
+    dist_infos = [join(site_dir, name) for site_dir in site_dirs for name in sorted(os.listdir(site_dir))
+                  if name.endswith(('.dist-info', '.egg-info'))]
+
+    if project_name:
+        normalized = _normalize(project_name)
+        return [dist_info for dist_info in dist_infos if _normalize(basename(dist_info).split('-')[0]) == normalized]
+
+    return dist_infos
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def _open_file(path: str) -> IO[bytes]:
+    return open(path, 'rb')
@@ -0,0 +1,187 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from functools import lru_cache
+from os.path import isdir, isfile, basename, dirname, join, relpath
+from tempfile import mkdtemp
+from typing import Optional
+
+from pack_artifacts import copy_file, link_file
+from pack_common import CACHE_ROOT, get_absolute_path, is_ignored_directory
+
+DEFAULT_CACHE_DIR = f'{CACHE_ROOT}/build'
+DEFAULT_CACHE_SIZE_MB = 2048
+
+MANIFEST_FILE = 'artifacts.json'
+
+TOOL_VERSION_COMMANDS = {
+    'fpm-deb': [['fpm', '--version']],
+    'dh-virtualenv': [['dpkg', '--version'], ['dpkg-buildpackage', '--version'], ['dh_virtualenv', '--version']],
+}
+
+
+class BuildCache:
+    """Content-addressed cache of packaging script outputs with size-based LRU eviction.
+
+    With link set, the packages are hardlinked between the cache and the output directories instead of copied,
+    for packages committed to the artifact store, which are never written in place.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024,
+                 link: bool = False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.link = link
+
+    def get_key(self, workspace_dir: str, script: str, arguments: list[str], configuration: dict[str, str],
+                python_bin: str, script_file: str) -> str:
+        digest = hashlib.sha256()
+
+        _update_json(digest, {
+            'script': script,
+            'scripts': get_scripts_hash(script_file),
+            'arguments': arguments,
+            'configuration': configuration,
+            'tools': [get_tool_version((python_bin, '--version'))]
+            + [get_tool_version(tuple(command)) for command in TOOL_VERSION_COMMANDS.get(script, [])],
+        })
+
+        hash_directory(digest, workspace_dir)
+
+        # Files referenced by the arguments may live outside the workspace
+        for argument in arguments:
+            for file in sorted(glob.glob(get_absolute_path(argument, workspace_dir))):
+                if isfile(file):
+                    _update_json(digest, file)
+                    hash_file(digest, file)
+
+        return digest.hexdigest()
+
+    def restore(self, key: str, output_dir: str) -> Optional[list[str]]:
+        entry_dir = join(self.cache_dir, key)
+
+        try:
+            with open(join(entry_dir, MANIFEST_FILE), 'r') as file:
+                artifacts: list[str] = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        restored = []
+
+        for artifact in artifacts:
+            self._install(join(entry_dir, artifact), join(output_dir, artifact))
+            restored.append(join(output_dir, artifact))
+
+        # Directory modification time is used as the last access time for LRU eviction
+        os.utime(entry_dir)
+
+        return restored
+
+    def store(self, key: str, artifacts: list[str]) -> None:
+        if not artifacts or not all(isfile(artifact) for artifact in artifacts):
+            return
+
+        if isdir(join(self.cache_dir, key)):
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        temp_dir = mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+
+        try:
+            for artifact in artifacts:
+                self._install(artifact, join(temp_dir, basename(artifact)))
+
+            with open(join(temp_dir, MANIFEST_FILE), 'w') as file:
+                json.dump([basename(artifact) for artifact in artifacts], file)
+
+            os.rename(temp_dir, join(self.cache_dir, key))
+        except OSError as error:
+            print(f'Failed to store packages in cache: {error}', file=sys.stderr)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.evict()
+
+    def _install(self, source: str, target: str) -> None:
+        if self.link:
+            link_file(source, target)
+        else:
+            copy_file(source, target)
+
+    def evict(self) -> None:
+        entries = []
+
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                size = sum(file.stat().st_size for file in os.scandir(entry.path) if file.is_file())
+                entries.append((entry.stat().st_mtime, size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            print(f'Evicting cache entry {path}', file=sys.stderr)
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+
+
+def hash_directory(digest: 'hashlib._Hash', directory: str) -> None:
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not is_ignored_directory(name))
+
+        for name in sorted(files):
+            path = join(root, name)
+            _update_json(digest, relpath(path, directory))
+            hash_file(digest, path)
+
+
+def hash_file(digest: 'hashlib._Hash', path: str) -> None:
+    if isdir(path) or not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+
+
+@lru_cache(maxsize=None)
+def get_scripts_hash(script_file: str) -> str:
+    """Returns a hash of the packaging script and the pack_* modules next to it, so that upgrading the tools
+    invalidates the packages built by the previous version."""
+    digest = hashlib.sha256()
+
+    for path in [script_file] + sorted(glob.glob(join(dirname(script_file), 'pack_*.py'))):
+        _update_json(digest, basename(path))
+        hash_file(digest, path)
+
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_tool_version(command: tuple[str, ...]) -> str:
+    try:
+        result = subprocess.run(command, text=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError:
+        return f'{command[0]}: missing'
+
+    first_line = result.stdout.strip().split('\n')[0]
+
+    return f'{command[0]}: {first_line}'
+
+
+def _update_json(digest: 'hashlib._Hash', value: object) -> None:
+    digest.update(json.dumps(value, sort_keys=True).encode())
+    digest.update(b'\0')
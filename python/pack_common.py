@@ -2,14 +2,107 @@
 # SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
 # SPDX-License-Identifier: MIT
 
+import ast
+import contextvars
+import fnmatch
+import json
+import os
 import re
+import selectors
+import subprocess
 import sys
+from argparse import ArgumentParser, Namespace
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial
-from os.path import exists
+from configparser import ConfigParser
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from os.path import basename, exists, expanduser
 from subprocess import PIPE, Popen
-from typing import Generator, Union
+from types import ModuleType
+from typing import IO, Any, Generator, Optional, Union
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11, pyproject.toml metadata is resolved by running setup.py
+    tomllib = None  # type: ignore[assignment]
+
+CACHE_ROOT = f"{os.environ.get('XDG_CACHE_HOME', expanduser('~/.cache'))}/packaging-tools"
+DEFAULT_WHEELHOUSE_DIR = f'{CACHE_ROOT}/wheelhouse'
+
+CHUNK_SIZE = 64 * 1024
+LOG_BUFFER_SIZE = 1024 * 1024
+RETAINED_LINES = 1000
+
+# Build outputs and metadata of the workspace, which are not inputs of the packages
+IGNORED_DIRECTORIES = ['build', 'dist', '*.egg-info', '.git', '__pycache__']
+
+COMPRESSION_TYPES = ['xz', 'zstd', 'gzip', 'none']
+FPM_COMPRESSION_TYPES = {'xz': 'xz', 'zstd': 'zst', 'gzip': 'gz', 'none': 'none'}
+
+# Project metadata resolved by pack_python, passed to the packaging scripts as JSON
+METADATA_ENVIRONMENT = 'PACK_PYTHON_METADATA'
+METADATA_FILES = ['pyproject.toml', 'setup.cfg', 'setup.py']
+SETUP_KEYWORDS = {'name': 'name', 'version': 'version', 'install_requires': 'dependencies',
+                  'entry_points': 'entry_points'}
+
+# Environment of the packaging scripts run in-process or for a server request, on top of the process environment
+_script_environment: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar('script_environment',
+                                                                                     default={})
+# Umask of the commands run by the packaging scripts of a pack_python server request, -1 inherits the process umask
+_script_umask: contextvars.ContextVar[int] = contextvars.ContextVar('script_umask', default=-1)
+
+PYTHON_TAG_SCRIPT = ("import sys, sysconfig; i = sys.implementation; "
+                     "v = f'{i.name[0]}p{i.version.major}{i.version.minor}'; "
+                     "print(f\"{v}-{v}{sys.abiflags}-{sysconfig.get_platform().replace('-', '_').replace('.', '_')}\")")
+
+
+@contextmanager
+def script_environment(variables: dict[str, str], umask: Optional[int] = None) -> Generator[None, None, None]:
+    """Sets environment variables and optionally the umask for the packaging script run in the current context and the
+    commands it runs, without changing the environment of the process shared by the other threads."""
+    token = _script_environment.set({**_script_environment.get(), **variables})
+    umask_token = _script_umask.set(umask) if umask is not None else None
+
+    try:
+        yield
+    finally:
+        if umask_token:
+            _script_umask.reset(umask_token)
+
+        _script_environment.reset(token)
+
+
+def get_environment_variable(name: str, default: Optional[str] = None) -> Optional[str]:
+    return _script_environment.get().get(name, os.environ.get(name, default))
+
+
+def get_command_environment(env: Optional[dict[str, str]] = None) -> Optional[dict[str, str]]:
+    if not (variables := _script_environment.get()):
+        return env
+
+    return {**(env if env is not None else os.environ), **variables}
+
+
+def get_command_umask() -> int:
+    """Returns the umask of the commands run in the current context, -1 to inherit the umask of the process."""
+    return _script_umask.get()
+
+
+@lru_cache(maxsize=None)
+def load_script(script_file: str) -> ModuleType:
+    """Loads a packaging script as a module, without running its main function."""
+    name = basename(script_file).replace('-', '_')
+    loader = SourceFileLoader(name, script_file)
+    spec = spec_from_loader(name, loader)
+    assert spec is not None
+
+    module = module_from_spec(spec)
+    loader.exec_module(module)
+
+    return module
 
 
 def check_workspace(workspace_dir: str) -> None:
@@ -23,41 +116,354 @@ def check_workspace(workspace_dir: str) -> None:
 
 
 def run_command(workspace_dir: str, command: Union[str, list[str]], matcher: str,
-                first_match_only: bool = True) -> Generator[str, None, None]:
+                first_match_only: bool = True, env: Optional[dict[str, str]] = None, log_file: Optional[str] = None,
+                max_lines: int = RETAINED_LINES) -> Generator[str, None, None]:
+    """Runs the command and yields the first group of the stdout lines matching the matcher as soon as they appear.
+
+    The output of the command is echoed to stderr, or written to the log file in quiet mode. Only the last max_lines
+    lines are retained in memory, to be printed to stderr if the command fails in quiet mode.
+    The generator has to be exhausted, as the return code of the command is checked after the last match.
+    """
     command_line = command if isinstance(command, str) else ' '.join(command)
 
     print(f"Running command '{command_line}' with output matcher {matcher}", file=sys.stderr)
 
-    with Popen(command_line, cwd=workspace_dir, shell=True, text=True, stdout=PIPE, stderr=PIPE) as process:
-        pattern = re.compile(matcher)
-        output: list[str] = []
+    pattern = re.compile(matcher)
+    retained: deque[bytes] = deque(maxlen=max_lines)
+    matched = False
+
+    with _open_log(log_file) as log, Popen(command_line, cwd=workspace_dir, shell=True, stdout=PIPE, stderr=PIPE,
+                                           env=get_command_environment(env), umask=get_command_umask()) as process:
+        for line in _read_lines(process, log, retained):
+            if (match := pattern.match(line)) and not (first_match_only and matched):
+                matched = True
+                yield match.group(1)
+
+        return_code = process.wait()
+
+    if return_code:
+        if log_file and retained:
+            sys.stderr.write(b'\n'.join(retained).decode(errors='replace') + '\n')
+
+        print(f"Command '{command_line}' failed with return code {return_code}", file=sys.stderr)
+        exit(return_code)
+
+
+@contextmanager
+def _open_log(log_file: Optional[str]) -> Generator[IO[bytes], None, None]:
+    if log_file:
+        with open(log_file, 'ab', buffering=LOG_BUFFER_SIZE) as log:
+            yield log
+    else:
+        sys.stderr.flush()
+        yield sys.stderr.buffer
+        sys.stderr.buffer.flush()
+
+
+def _read_lines(process: 'Popen[bytes]', log: IO[bytes], retained: deque[bytes]) -> Generator[str, None, None]:
+    selector = selectors.DefaultSelector()
+
+    # Each stream keeps its incomplete last line, so only whole lines are written to the log
+    for stream in (process.stdout, process.stderr):
+        if stream:
+            selector.register(stream, selectors.EVENT_READ, bytearray())
+
+    stdout_fd = process.stdout.fileno() if process.stdout else -1
+
+    while selector.get_map():
+        for key, _ in selector.select():
+            pending: bytearray = key.data
+            chunk = os.read(key.fd, CHUNK_SIZE)
+
+            if not chunk:
+                selector.unregister(key.fileobj)
+                chunk = b'\n' if pending else b''
+
+            pending.extend(chunk)
+            end = pending.rfind(b'\n') + 1
+
+            if not end:
+                continue
+
+            lines = bytes(pending[:end])
+            del pending[:end]
+
+            log.write(lines)
+            retained.extend(lines.splitlines())
+
+            if key.fd == stdout_fd:
+                yield from (line.decode(errors='replace') for line in lines.splitlines())
+
+    selector.close()
+
+
+@dataclass
+class Compression:
+    """Compression of the .deb package members, None values mean the default of the packaging tool."""
+
+    type: Optional[str] = None
+    level: Optional[int] = None
+    threads: int = 0
+
+    def get_threads(self) -> int:
+        return self.threads or os.cpu_count() or 1
+
+    def get_dpkg_environment(self) -> dict[str, str]:
+        env = {'DPKG_DEB_THREADS_MAX': str(self.get_threads())}
+
+        if self.type:
+            env['DPKG_DEB_COMPRESSOR_TYPE'] = self.type
+
+        if self.level is not None:
+            env['DPKG_DEB_COMPRESSOR_LEVEL'] = str(self.level)
+
+        return env
+
+    def get_compressor_environment(self) -> dict[str, str]:
+        # Used by the xz and zstd executables, when they are run by other tools
+        env = {'XZ_OPT': f'-T{self.get_threads()}', 'ZSTD_NBTHREADS': str(self.get_threads())}
+
+        if self.level is not None:
+            env['XZ_OPT'] += f' -{self.level}'
+            env['ZSTD_CLEVEL'] = str(self.level)
+
+        return env
+
+
+def add_compression_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        '-z', '--compression', help='compression of the .deb package, default of the packaging tool if not set',
+        choices=COMPRESSION_TYPES)
+    parser.add_argument('--compression-level', help='compression level', type=int)
+    parser.add_argument(
+        '--compression-threads', help='number of compression threads, all CPU cores if not set', type=int)
+
+
+def get_compression(arguments: Namespace) -> Compression:
+    return Compression(arguments.compression, arguments.compression_level, arguments.compression_threads or 0)
+
+
+@dataclass
+class ProjectMetadata:
+    """Metadata of the Python project in the workspace, entry points are lists of 'name = module:function' by group."""
+
+    name: Optional[str] = None
+    version: Optional[str] = None
+    dependencies: list[str] = field(default_factory=list)
+    entry_points: dict[str, list[str]] = field(default_factory=dict)
+
+    def update(self, metadata: dict[str, Any]) -> None:
+        # Values found in the previous sources take precedence
+        for key, value in metadata.items():
+            if value and not getattr(self, key):
+                setattr(self, key, value)
+
+    def get_environment(self) -> dict[str, str]:
+        return {METADATA_ENVIRONMENT: json.dumps(asdict(self))}
 
-        with ThreadPoolExecutor(2) as pool:
-            exhaust = partial(pool.submit, partial(deque, maxlen=0))
-            if process.stdout:
-                exhaust(filter(line, pattern, output) for line in process.stdout)
-            if process.stderr:
-                exhaust(print(line[:-1], file=sys.stderr) for line in process.stderr)
 
-        return_code = process.poll()
+def get_metadata(workspace_dir: str, python_bin: str = 'python3') -> ProjectMetadata:
+    """Returns the metadata passed by pack_python, or resolves it from pyproject.toml, setup.cfg and a static
+    parse of setup.py. setup.py is only run if the name or version is computed, e.g. read from a file.
+    The name and version are None if they could not be resolved."""
+    if value := get_environment_variable(METADATA_ENVIRONMENT):
+        return ProjectMetadata(**json.loads(value))
 
-        if return_code:
-            print(f"Command '{command_line}' failed with return code {return_code}", file=sys.stderr)
-            exit(return_code)
+    stamp = tuple((name, os.stat(path).st_mtime_ns) for name in METADATA_FILES
+                  if exists(path := f'{workspace_dir}/{name}'))
 
-        for line in output:
-            yield line
-            if first_match_only:
-                break
+    metadata = ProjectMetadata(**asdict(_read_static_metadata(workspace_dir, stamp)))
 
+    if not metadata.name or not metadata.version:
+        metadata.update(_run_setup_py_metadata(workspace_dir, python_bin))
 
-def filter(line: str, pattern: re.Pattern[str], output: list[str]) -> str:
-    print(line[:-1], file=sys.stderr)
+    return metadata
 
-    if match := pattern.match(line):
-        output.append(match.group(1))
 
-    return line
+@lru_cache(maxsize=None)
+def _read_static_metadata(workspace_dir: str, stamp: tuple[tuple[str, int], ...]) -> ProjectMetadata:
+    # Cached by the modification times of the files, as pack_python --serve resolves it for many builds
+    metadata = ProjectMetadata()
+
+    metadata.update(_read_pyproject_metadata(f'{workspace_dir}/pyproject.toml'))
+    metadata.update(_read_setup_cfg_metadata(f'{workspace_dir}/setup.cfg'))
+    metadata.update(_read_setup_py_metadata(f'{workspace_dir}/setup.py'))
+
+    return metadata
+
+
+def _read_pyproject_metadata(pyproject_file: str) -> dict[str, Any]:
+    if not tomllib or not exists(pyproject_file):
+        return {}
+
+    with open(pyproject_file, 'rb') as file:
+        project = tomllib.load(file).get('project', {})
+
+    entry_points = {group: [f'{name} = {value}' for name, value in values.items()]
+                    for group, values in project.get('entry-points', {}).items()}
+
+    for group, key in [('console_scripts', 'scripts'), ('gui_scripts', 'gui-scripts')]:
+        if scripts := project.get(key):
+            entry_points[group] = [f'{name} = {value}' for name, value in scripts.items()]
+
+    return {
+        'name': project.get('name'),
+        'version': project.get('version'),
+        'dependencies': project.get('dependencies', []),
+        'entry_points': entry_points,
+    }
+
+
+def _read_setup_cfg_metadata(setup_cfg_file: str) -> dict[str, Any]:
+    if not exists(setup_cfg_file):
+        return {}
+
+    parser = ConfigParser(interpolation=None)
+    parser.read(setup_cfg_file)
+
+    version = parser.get('metadata', 'version', fallback=None)
+
+    entry_points = {}
+
+    if parser.has_section('options.entry_points'):
+        entry_points = {group: _split_lines(value) for group, value in parser.items('options.entry_points')}
+
+    return {
+        'name': parser.get('metadata', 'name', fallback=None),
+        # Directives like attr: and file: are resolved by setuptools
+        'version': version if version and ':' not in version else None,
+        'dependencies': _split_lines(parser.get('options', 'install_requires', fallback='')),
+        'entry_points': entry_points,
+    }
+
+
+def _read_setup_py_metadata(setup_py_file: str) -> dict[str, Any]:
+    """Reads the literal keyword arguments of the setup() call, also resolving module level constants."""
+    if not (tree := _parse_python_file(setup_py_file)):
+        return {}
+
+    constants = _get_constants(tree)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _get_function_name(node.func) == 'setup':
+            metadata = {}
+
+            for keyword in node.keywords:
+                if keyword.arg in SETUP_KEYWORDS:
+                    metadata[SETUP_KEYWORDS[keyword.arg]] = _evaluate(keyword.value, constants)
+
+            if isinstance(entry_points := metadata.get('entry_points'), dict):
+                metadata['entry_points'] = {group: _split_lines(value) if isinstance(value, str) else list(value)
+                                            for group, value in entry_points.items()}
+            else:
+                metadata.pop('entry_points', None)
+
+            return metadata
+
+    return {}
+
+
+def _get_constants(tree: ast.Module) -> dict[str, Any]:
+    constants = {}
+
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            if isinstance(target := statement.targets[0], ast.Name):
+                if (value := _evaluate(statement.value, {})) is not None:
+                    constants[target.id] = value
+
+    return constants
+
+
+def _parse_python_file(python_file: str) -> Optional[ast.Module]:
+    if not exists(python_file):
+        return None
+
+    try:
+        with open(python_file, 'r') as file:
+            return ast.parse(file.read(), python_file)
+    except (SyntaxError, ValueError):
+        # E.g. a syntax newer than this interpreter, setup.py is run with the target interpreter instead
+        return None
+
+
+def _run_setup_py_metadata(workspace_dir: str, python_bin: str) -> dict[str, Any]:
+    try:
+        result = subprocess.run([python_bin, 'setup.py', '--name', '--version'], cwd=workspace_dir, text=True,
+                                stdout=PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        result = subprocess.CompletedProcess([], 127, '')
+
+    lines = result.stdout.strip().splitlines()
+
+    if result.returncode or len(lines) < 2:
+        # The packaging tools report the error of setup.py when they run it
+        print(f'Failed to resolve the project name and version in {workspace_dir}', file=sys.stderr)
+        return {}
+
+    return {'name': lines[-2].strip(), 'version': lines[-1].strip()}
+
+
+def _evaluate(node: ast.expr, constants: dict[str, Any]) -> Any:
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+
+    try:
+        return ast.literal_eval(node)
+    except (SyntaxError, ValueError, TypeError):
+        return None
+
+
+def _get_function_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        return node.attr
+    else:
+        return None
+
+
+def _split_lines(value: str) -> list[str]:
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+
+def add_reproducible_argument(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        '--reproducible', help='create identical packages from identical inputs, using SOURCE_DATE_EPOCH as timestamp',
+        action='store_true')
+
+
+def get_source_date_epoch(workspace_dir: str) -> int:
+    """Returns the SOURCE_DATE_EPOCH environment variable if set, otherwise the time of the last git commit
+    of the workspace, or the latest modification time of the workspace files if it is not committed."""
+    if value := get_environment_variable('SOURCE_DATE_EPOCH'):
+        return int(value)
+
+    try:
+        result = subprocess.run(['git', 'log', '-1', '--format=%ct', '--', '.'], cwd=workspace_dir, text=True,
+                                stdout=PIPE, stderr=subprocess.DEVNULL)
+
+        if not result.returncode and result.stdout.strip():
+            return int(result.stdout.strip())
+    except OSError:
+        pass
+
+    latest = 0
+
+    for root, dirs, files in os.walk(workspace_dir):
+        dirs[:] = [name for name in dirs if not is_ignored_directory(name)]
+        latest = max([latest, *(int(os.lstat(f'{root}/{name}').st_mtime) for name in files)])
+
+    return latest
+
+
+def get_reproducible_environment(workspace_dir: str) -> dict[str, str]:
+    # Honored by setuptools, wheel, fpm, dpkg and the Python bytecode compiler
+    return {'SOURCE_DATE_EPOCH': str(get_source_date_epoch(workspace_dir)), 'PYTHONHASHSEED': '0', 'TZ': 'UTC'}
+
+
+def is_ignored_directory(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_DIRECTORIES)
 
 
 def get_absolute_path(path: str, base_path: str) -> str:
@@ -65,3 +471,19 @@ def get_absolute_path(path: str, base_path: str) -> str:
         return path
     else:
         return f'{base_path}/{path}'
+
+
+@lru_cache(maxsize=None)
+def get_python_tag(python_bin: str) -> str:
+    """Returns the interpreter, ABI and platform tag of the Python executable, e.g. cp311-cp311-linux_x86_64."""
+    result = subprocess.run([python_bin, '-c', PYTHON_TAG_SCRIPT], text=True, stdout=PIPE)
+
+    if result.returncode:
+        print(f'Failed to determine the platform tag of {python_bin}', file=sys.stderr)
+        exit(result.returncode)
+
+    return result.stdout.strip()
+
+
+def get_wheelhouse_dir(wheelhouse: str, python_bin: str) -> str:
+    return f'{wheelhouse}/{get_python_tag(python_bin)}'
@@ -0,0 +1,393 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from os.path import dirname
+from tempfile import SpooledTemporaryFile
+from typing import IO, Callable, Generator, Iterable, Optional, cast
+
+from pack_common import Compression
+
+AR_MAGIC = b'!<arch>\n'
+DEBIAN_BINARY = b'2.0\n'
+SPOOL_SIZE = 64 * 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst', 'none': ''}
+DEFAULT_COMPRESSION = 'gzip'
+
+MAINTAINER_SCRIPTS = ['preinst', 'postinst', 'prerm', 'postrm']
+
+
+@dataclass
+class DataEntry:
+    """A regular file of the package data, read lazily when the archive is written."""
+
+    path: str
+    size: int
+    open: Callable[[], IO[bytes]]
+    mode: int = 0o644
+
+
+@dataclass
+class DebPackage:
+    control: dict[str, str]
+    entries: list[DataEntry] = field(default_factory=list)
+    scripts: dict[str, bytes] = field(default_factory=dict)
+    mtime: int = 0
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.control['Package']}_{self.control['Version']}_{self.control['Architecture']}.deb"
+
+
+def write_deb(package: DebPackage, output_dir: str, compression: Optional[Compression] = None) -> str:
+    """Writes the package into the output directory and returns the path of the created .deb file.
+
+    The data archive is streamed from the entries into a spooled temporary file while computing the md5sums,
+    so the package content is never staged on disk as a directory tree.
+    The data archive is compressed with gzip by default, xz and zstd use the multi-threaded executables if available.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    compression = compression or Compression()
+    data_member = f'data.tar{COMPRESSION_EXTENSIONS[compression.type or DEFAULT_COMPRESSION]}'
+
+    deb_file = f'{output_dir}/{package.file_name}'
+
+    with SpooledTemporaryFile(SPOOL_SIZE) as data_tar:
+        md5sums, installed_size = _write_data_tar(package, data_tar, compression)
+
+        control = _add_installed_size(package.control, installed_size)
+
+        with io.BytesIO() as control_tar:
+            _write_control_tar(package, control, md5sums, control_tar)
+
+            with open(f'{deb_file}.tmp', 'wb') as file:
+                file.write(AR_MAGIC)
+                _write_ar_member(file, 'debian-binary', io.BytesIO(DEBIAN_BINARY), len(DEBIAN_BINARY), package.mtime)
+                _write_ar_member(file, 'control.tar.gz', control_tar, control_tar.tell(), package.mtime)
+                _write_ar_member(file, data_member, data_tar, data_tar.tell(), package.mtime)
+
+    os.replace(f'{deb_file}.tmp', deb_file)
+
+    return deb_file
+
+
+def format_control(control: dict[str, str]) -> str:
+    lines = []
+
+    for name, value in control.items():
+        value_lines = value.strip('\n').split('\n')
+        lines.append(f'{name}: {value_lines[0]}')
+        lines.extend(f' {line}' if line.strip() else ' .' for line in value_lines[1:])
+
+    return '\n'.join(lines) + '\n'
+
+
+def read_control(deb_file: str) -> str:
+    """Reads the control file of a .deb package, without extracting the data archive."""
+    with open(deb_file, 'rb') as file:
+        for name, member in iter_deb_members(file, deb_file):
+            if name.startswith('control.tar'):
+                content = _decompress(member.read(), name[len('control.tar'):])
+
+                with tarfile.open(fileobj=io.BytesIO(content), mode='r:') as tar:
+                    for info in tar:
+                        if info.name in ('./control', 'control') and (control := tar.extractfile(info)):
+                            return control.read().decode()
+
+                break
+
+    raise ValueError(f'No control file found in {deb_file}')
+
+
+def iter_deb_members(file: IO[bytes], deb_file: str) -> Generator[tuple[str, IO[bytes]], None, None]:
+    """Iterates the ar members of a .deb package, yielding their names and readers limited to their content.
+
+    The reader is only valid until the next member is requested, the skipped content is never read.
+    """
+    if file.read(len(AR_MAGIC)) != AR_MAGIC:
+        raise ValueError(f'{deb_file} is not a .deb package')
+
+    while header := file.read(60):
+        name = header[:16].decode().strip().rstrip('/')
+        size = int(header[48:58])
+        start = file.tell()
+
+        yield name, cast(IO[bytes], _MemberReader(file, size))
+
+        file.seek(start + size + size % 2)
+
+
+@contextmanager
+def open_tar_member(member: IO[bytes], name: str) -> Generator[tarfile.TarFile, None, None]:
+    """Opens a compressed tar member of a .deb package as a stream, decompressing it while it is read."""
+    with open_member_content(member, name) as stream:
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            yield tar
+
+
+@contextmanager
+def open_member_content(member: IO[bytes], name: str) -> Generator[IO[bytes], None, None]:
+    """Opens a compressed tar member of a .deb package as a stream of the uncompressed tar archive."""
+    extension = name[name.index('.tar') + len('.tar'):]
+
+    with _open_decompressor(member, extension) as stream:
+        yield stream
+
+
+def parse_control(content: str) -> dict[str, str]:
+    """Parses a control file into fields, keeping the raw value after the colon including the continuation lines."""
+    fields: dict[str, str] = {}
+    name = None
+
+    for line in content.rstrip('\n').split('\n'):
+        if line.startswith((' ', '\t')) and name:
+            fields[name] += f'\n{line}'
+        elif ':' in line:
+            name, _, value = line.partition(':')
+            fields[name] = value
+
+    return fields
+
+
+def _decompress(content: bytes, extension: str) -> bytes:
+    if extension == '.gz':
+        return gzip.decompress(content)
+    elif extension == '.xz':
+        return lzma.decompress(content)
+    elif extension == '.zst':
+        _check_executable('zstd')
+        return subprocess.run(['zstd', '-dc'], input=content, stdout=subprocess.PIPE, check=True).stdout
+    else:
+        return content
+
+
+@contextmanager
+def _open_decompressor(member: IO[bytes], extension: str) -> Generator[IO[bytes], None, None]:
+    if extension == '.gz':
+        with gzip.GzipFile(fileobj=member, mode='rb') as file:
+            yield cast(IO[bytes], file)
+    elif extension == '.xz':
+        with lzma.LZMAFile(member, mode='rb') as file:
+            yield file
+    elif extension == '.zst':
+        with _open_process_decompressor(member, ['zstd', '-dc']) as file:
+            yield file
+    else:
+        yield member
+
+
+@contextmanager
+def _open_process_decompressor(member: IO[bytes], command: list[str]) -> Generator[IO[bytes], None, None]:
+    _check_executable(command[0])
+
+    # Unbuffered, so closing the input of a stopped decompressor does not fail on flushing
+    with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0) as process:
+        assert process.stdin and process.stdout
+        feeder = threading.Thread(target=_feed, args=(member, process.stdin))
+        feeder.start()
+
+        try:
+            yield process.stdout
+        finally:
+            # Stops the decompressor if the stream was not read to its end
+            process.stdout.close()
+            feeder.join()
+
+
+def _feed(source: IO[bytes], target: IO[bytes]) -> None:
+    try:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+        target.close()
+    except BrokenPipeError:
+        pass
+
+
+def _add_installed_size(fields: dict[str, str], installed_size: int) -> dict[str, str]:
+    if 'Installed-Size' in fields:
+        return fields
+
+    control = {}
+
+    for name, value in fields.items():
+        control[name] = value
+
+        if name == 'Architecture':
+            control['Installed-Size'] = str(installed_size)
+
+    return control
+
+
+def _write_data_tar(package: DebPackage, output: IO[bytes], compression: Compression) -> tuple[list[str], int]:
+    md5sums = []
+    total_size = 0
+
+    with _open_tar(output, package.mtime, compression) as tar:
+        for directory in _get_directories(package.entries):
+            tar.addfile(_create_tar_info(f'.{directory}', package.mtime, tarfile.DIRTYPE, 0o755))
+
+        for entry in sorted(package.entries, key=lambda e: e.path):
+            digest = hashlib.md5()
+
+            with entry.open() as source:
+                tar.addfile(_create_tar_info(f'.{entry.path}', package.mtime, tarfile.REGTYPE, entry.mode, entry.size),
+                            _HashingReader(source, digest))
+
+            md5sums.append(f'{digest.hexdigest()}  {entry.path.lstrip("/")}')
+            total_size += entry.size
+
+    return md5sums, (total_size + 1023) // 1024
+
+
+def _write_control_tar(package: DebPackage, control: dict[str, str], md5sums: list[str], output: IO[bytes]) -> None:
+    files = {
+        'control': (format_control(control).encode(), 0o644),
+        'md5sums': (('\n'.join(md5sums) + '\n').encode(), 0o644),
+    }
+
+    for name in MAINTAINER_SCRIPTS:
+        if content := package.scripts.get(name):
+            files[name] = (content, 0o755)
+
+    with _open_tar(output, package.mtime) as tar:
+        tar.addfile(_create_tar_info('.', package.mtime, tarfile.DIRTYPE, 0o755))
+
+        for name, (content, mode) in files.items():
+            tar.addfile(_create_tar_info(f'./{name}', package.mtime, tarfile.REGTYPE, mode, len(content)),
+                        io.BytesIO(content))
+
+
+@contextmanager
+def _open_tar(output: IO[bytes], mtime: int,
+              compression: Optional[Compression] = None) -> Generator[tarfile.TarFile, None, None]:
+    with _open_compressor(output, mtime, compression or Compression()) as compressor:
+        with tarfile.open(fileobj=compressor, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+            yield tar
+
+
+@contextmanager
+def _open_compressor(output: IO[bytes], mtime: int, compression: Compression) -> Generator[IO[bytes], None, None]:
+    compression_type = compression.type or DEFAULT_COMPRESSION
+
+    if compression_type == 'none':
+        yield output
+    elif compression_type == 'gzip':
+        with gzip.GzipFile(fileobj=output, mode='wb', mtime=mtime, compresslevel=_get_level(compression, 9)) as file:
+            yield cast(IO[bytes], file)
+    elif compression_type == 'xz' and not shutil.which('xz'):
+        with lzma.LZMAFile(output, mode='wb', preset=_get_level(compression, 6)) as file:
+            yield file
+    else:
+        with _open_process_compressor(output, compression_type, compression) as file:
+            yield file
+
+
+@contextmanager
+def _open_process_compressor(output: IO[bytes], executable: str,
+                             compression: Compression) -> Generator[IO[bytes], None, None]:
+    _check_executable(executable)
+
+    command = [executable, '-c', f'-T{compression.get_threads()}']
+
+    if compression.level is not None:
+        command.append(f'-{compression.level}')
+
+    # The compressor writes directly to the file descriptor of the output, rolling a spooled file over to disk
+    output.flush()
+
+    with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=output.fileno()) as process:
+        assert process.stdin
+        yield process.stdin
+        process.stdin.close()
+
+    if process.returncode:
+        raise OSError(f'{executable} failed with return code {process.returncode}')
+
+    output.seek(0, io.SEEK_END)
+
+
+def _check_executable(executable: str) -> None:
+    if not shutil.which(executable):
+        print(f'{executable} is not installed, it is required for {executable} compressed packages', file=sys.stderr)
+        exit(1)
+
+
+def _get_level(compression: Compression, default: int) -> int:
+    return default if compression.level is None else compression.level
+
+
+def _get_directories(entries: Iterable[DataEntry]) -> list[str]:
+    directories = {'/'}
+
+    for entry in entries:
+        directory = dirname(entry.path)
+        while directory not in directories:
+            directories.add(directory)
+            directory = dirname(directory)
+
+    return sorted(directory.rstrip('/') + '/' for directory in directories)
+
+
+def _create_tar_info(name: str, mtime: int, type: bytes, mode: int, size: int = 0) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.type = type
+    info.mode = mode
+    info.size = size
+    info.mtime = mtime
+    info.uid = info.gid = 0
+    info.uname = info.gname = 'root'
+    return info
+
+
+def _write_ar_member(file: IO[bytes], name: str, content: IO[bytes], size: int, mtime: int) -> None:
+    header = f'{name:<16}{mtime:<12}{0:<6}{0:<6}{0o100644:<8o}{size:<10}`\n'
+    file.write(header.encode())
+
+    content.seek(0)
+    shutil.copyfileobj(content, file, 1024 * 1024)
+
+    if size % 2:
+        file.write(b'\n')
+
+
+class _MemberReader:
+
+    def __init__(self, file: IO[bytes], size: int) -> None:
+        self._file = file
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+
+class _HashingReader:
+
+    def __init__(self, source: IO[bytes], digest: 'hashlib._Hash') -> None:
+        self._source = source
+        self._digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self._digest.update(data)
+        return data
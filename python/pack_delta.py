@@ -0,0 +1,585 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tarfile
+import threading
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from os.path import basename, getsize, join
+from tempfile import TemporaryDirectory
+from typing import IO, Any, Generator, Iterator, Optional
+
+from pack_deb import AR_MAGIC, open_member_content, parse_control, read_control
+
+DELTA_FORMAT = 1
+DELTA_EXTENSION = '.debdelta'
+DELTA_MAGIC = b'!<pack-deb-delta>\n'
+
+AR_HEADER_SIZE = 60
+CHUNK_SIZE = 1024 * 1024
+BLOB_LEVEL = 19
+
+# Compressor settings tried to reproduce a compressed member, starting with the defaults of dpkg-deb and pack_deb
+GZIP_LEVELS = [9, 6, 1, 2, 3, 4, 5, 7, 8]
+XZ_LEVELS = [6, 9, 0, 1, 2, 3, 4, 5, 7, 8]
+ZSTD_LEVELS = [3, 19, *range(1, 3), *range(4, 19)]
+# 0 is the multi-threaded mode of xz and zstd, their output does not depend on the number of threads
+THREADS = [0, 1]
+
+
+@dataclass
+class _Member:
+    name: str
+    header: bytes
+    path: str
+    sha256: str
+
+    @property
+    def kind(self) -> str:
+        return self.name.split('.')[0]
+
+
+def create_delta(old_deb: str, new_deb: str, delta_file: str) -> dict[str, Any]:
+    """Writes the delta reconstructing the new package from the old one, and returns its manifest.
+
+    Members of the new package equal to a member of the old one are copied. The tar archives are rebuilt from
+    their uncompressed content: unchanged files are copied from the old archive, changed files are binary diffs
+    against their old version, and the rest is stored compressed. The archives are compressed again with
+    the compressor settings reproducing the original member, which are searched when the delta is created.
+    Members which cannot be reproduced are stored as a binary diff of the compressed member.
+    """
+    with TemporaryDirectory(prefix='pack_delta-') as work_dir:
+        old_members = _extract_members(old_deb, join(work_dir, 'old'))
+        new_members = _extract_members(new_deb, join(work_dir, 'new'))
+        blobs: dict[str, str] = {}
+
+        manifest = {
+            'format': DELTA_FORMAT,
+            'old': {'sha256': _get_file_hash(old_deb), 'size': getsize(old_deb)},
+            'new': {'sha256': _get_file_hash(new_deb), 'size': getsize(new_deb), 'name': basename(new_deb)},
+            'members': [_create_member_delta(index, member, old_members, work_dir, blobs)
+                        for index, member in enumerate(new_members)],
+        }
+
+        _write_delta(delta_file, manifest, blobs)
+
+    return manifest
+
+
+def apply_delta(old_deb: str, delta_file: str, output_dir: str) -> str:
+    """Reconstructs the new package from the old one and the delta, returning the path of the new package."""
+    with TemporaryDirectory(prefix='pack_delta-') as work_dir, _DeltaReader(delta_file) as delta:
+        manifest = delta.manifest
+
+        if _get_file_hash(old_deb) != manifest['old']['sha256']:
+            raise ValueError(f'{delta_file} was not created from {old_deb}')
+
+        old_members = {member.name: member for member in _extract_members(old_deb, join(work_dir, 'old'))}
+        new_deb = join(output_dir, basename(manifest['new']['name']))
+        temp_file = f'{new_deb}.tmp'
+
+        try:
+            with open(temp_file, 'wb') as output:
+                output.write(AR_MAGIC)
+
+                for index, entry in enumerate(manifest['members']):
+                    content = _apply_member_delta(index, entry, old_members, delta, work_dir)
+                    _write_member(output, entry, content)
+
+            if _get_file_hash(temp_file) != manifest['new']['sha256']:
+                raise ValueError(f'Package reconstructed from {delta_file} differs from the original package')
+
+            os.replace(temp_file, new_deb)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    return new_deb
+
+
+def get_delta_name(old_deb: str, new_deb: str) -> str:
+    """Returns the name of the delta in the debdelta convention, package_oldversion_newversion_architecture."""
+    old_control, new_control = parse_control(read_control(old_deb)), parse_control(read_control(new_deb))
+    fields = [new_control['Package'], old_control['Version'], new_control['Version'], new_control['Architecture']]
+
+    return '_'.join(field.strip().replace(':', '%3a') for field in fields) + DELTA_EXTENSION
+
+
+def _create_member_delta(index: int, member: _Member, old_members: list[_Member], work_dir: str,
+                         blobs: dict[str, str]) -> dict[str, Any]:
+    entry: dict[str, Any] = {'name': member.name, 'header': member.header.decode('latin-1'), 'sha256': member.sha256}
+
+    if source := next((old for old in old_members if old.sha256 == member.sha256), None):
+        return {**entry, 'method': 'copy', 'source': source.name}
+
+    old = next((old for old in old_members if old.kind == member.kind), None)
+
+    if '.tar' in member.name:
+        content = _decompress_member(member, join(work_dir, f'{index}.new.tar'))
+
+        if compressor := _find_compressor(member, content):
+            old_content = _decompress_member(old, join(work_dir, f'{index}.old.tar')) if old else None
+            return {**entry, 'method': 'tar', 'source': old.name if old else None, 'compressor': compressor,
+                    **_create_tar_delta(index, content, old_content, work_dir, blobs)}
+
+    blob = f'{index}.patch.zst'
+    blobs[blob] = join(work_dir, blob)
+    window_log = _create_patch(old.path if old else None, member.path, blobs[blob])
+
+    return {**entry, 'method': 'patch', 'source': old.name if old else None, 'blob': blob, 'window_log': window_log}
+
+
+def _create_tar_delta(index: int, content: str, old_content: Optional[str], work_dir: str,
+                      blobs: dict[str, str]) -> dict[str, Any]:
+    old_by_hash: dict[str, tuple[int, int]] = {}
+    old_by_path: dict[str, tuple[int, int]] = {}
+
+    if old_content:
+        with tarfile.open(old_content, 'r:') as tar, open(old_content, 'rb') as data:
+            for info in tar:
+                if info.isreg():
+                    old_by_hash[_get_range_hash(data, info.offset_data, info.size)] = (info.offset_data, info.size)
+                    old_by_path[info.name] = (info.offset_data, info.size)
+
+    operations: list[list[Any]] = []
+    sources: list[list[int]] = []
+    inserted, patched, patch_source = [join(work_dir, f'{index}.{name}') for name in ['insert', 'patch', 'source']]
+
+    with tarfile.open(content, 'r:') as tar, open(content, 'rb') as data, open(inserted, 'wb') as insert_file, \
+            open(patched, 'wb') as patch_file, open(patch_source, 'wb') as source_file, \
+            open(old_content or os.devnull, 'rb') as old_data:
+        position = 0
+
+        for info in tar:
+            # Headers, and the padding of the previous file
+            _add_operation(operations, 'insert', _copy_range(data, position, info.offset_data - position, insert_file))
+            position = info.offset_data
+
+            if not info.isreg() or not info.size:
+                continue
+
+            if match := old_by_hash.get(_get_range_hash(data, info.offset_data, info.size)):
+                _add_operation(operations, 'copy', info.size, match[0])
+            elif match := old_by_path.get(info.name):
+                _add_operation(sources, 'copy', _copy_range(old_data, match[0], match[1], source_file), match[0])
+                _add_operation(operations, 'patch', _copy_range(data, info.offset_data, info.size, patch_file))
+            else:
+                _add_operation(operations, 'insert', _copy_range(data, info.offset_data, info.size, insert_file))
+
+            position += info.size
+
+        # End of archive blocks
+        _add_operation(operations, 'insert', _copy_range(data, position, getsize(content) - position, insert_file))
+
+    delta: dict[str, Any] = {'operations': operations, 'patch_sources': [[offset, size] for _, size, offset in sources]}
+
+    # Inserted headers and new files are compressed against the old archive, as they are mostly similar to it
+    for name, path, source in [('insert', inserted, old_content), ('patch', patched, patch_source)]:
+        if getsize(path):
+            blob = f'{index}.{name}.zst'
+            blobs[blob] = join(work_dir, blob)
+            delta[f'{name}_blob'] = blob
+            delta[f'{name}_window_log'] = _create_patch(source, path, blobs[blob])
+
+    return delta
+
+
+def _apply_member_delta(index: int, entry: dict[str, Any], old_members: dict[str, _Member], delta: '_DeltaReader',
+                        work_dir: str) -> str:
+    method = entry['method']
+    old = old_members.get(entry['source']) if entry.get('source') else None
+
+    if entry.get('source') and not old:
+        raise ValueError(f"Member {entry['source']} of the old package is missing")
+
+    if method == 'copy' and old:
+        return old.path
+
+    content = join(work_dir, f'{index}.member')
+
+    if method == 'patch':
+        _apply_patch(old.path if old else None, delta.extract(entry['blob'], work_dir), content,
+                     entry['window_log'])
+    elif method == 'tar':
+        new_tar = _apply_tar_delta(index, entry, old, delta, work_dir)
+
+        with open(content, 'wb') as output, closing(_compress(entry['compressor'], new_tar)) as chunks:
+            for chunk in chunks:
+                output.write(chunk)
+    else:
+        raise ValueError(f'Unsupported delta method {method} of member {entry["name"]}')
+
+    if _get_file_hash(content) != entry['sha256']:
+        raise ValueError(f"Reconstructed member {entry['name']} differs from the original, "
+                         f"the compressor on this host produces different output")
+
+    return content
+
+
+def _apply_tar_delta(index: int, entry: dict[str, Any], old: Optional[_Member], delta: '_DeltaReader',
+                     work_dir: str) -> str:
+    old_content = _decompress_member(old, join(work_dir, f'{index}.old.tar')) if old else None
+    inserted, patched, patch_source = [join(work_dir, f'{index}.{name}') for name in ['insert', 'patch', 'source']]
+    new_tar = join(work_dir, f'{index}.new.tar')
+
+    with open(old_content or os.devnull, 'rb') as old_data, open(patch_source, 'wb') as source_file:
+        for offset, size in entry['patch_sources']:
+            _copy_range(old_data, offset, size, source_file)
+
+    for name, path, source in [('insert', inserted, old_content), ('patch', patched, patch_source)]:
+        if blob := entry.get(f'{name}_blob'):
+            _apply_patch(source, delta.extract(blob, work_dir), path, entry[f'{name}_window_log'])
+        else:
+            open(path, 'wb').close()
+
+    with open(old_content or os.devnull, 'rb') as old_data, open(inserted, 'rb') as insert_file, \
+            open(patched, 'rb') as patch_file, open(new_tar, 'wb') as output:
+        for operation in entry['operations']:
+            if operation[0] == 'copy':
+                _copy_range(old_data, operation[2], operation[1], output)
+            else:
+                shutil.copyfileobj(_LimitedReader(insert_file if operation[0] == 'insert' else patch_file,
+                                                  operation[1]), output, CHUNK_SIZE)
+
+    return new_tar
+
+
+def _find_compressor(member: _Member, content: str) -> Optional[dict[str, Any]]:
+    for compressor in _get_compressors(member):
+        # Most settings produce different output from the first compressed block, they are stopped right there
+        with open(member.path, 'rb') as expected, closing(_compress(compressor, content)) as chunks:
+            if all(expected.read(len(chunk)) == chunk for chunk in chunks) and not expected.read(1):
+                return compressor
+
+    return None
+
+
+def _get_compressors(member: _Member) -> Iterator[dict[str, Any]]:
+    extension = member.name[member.name.index('.tar') + len('.tar'):]
+
+    if extension == '':
+        yield {'type': 'none'}
+    elif extension == '.gz':
+        header = _read_gzip_header(member.path)
+
+        for level in GZIP_LEVELS:
+            yield {'type': 'gzip', 'level': level, 'header': header.hex()}
+    elif extension in ('.xz', '.zst'):
+        for level in XZ_LEVELS if extension == '.xz' else ZSTD_LEVELS:
+            for threads in THREADS:
+                yield {'type': extension[1:], 'level': level, 'threads': threads}
+
+
+def _compress(compressor: dict[str, Any], content: str) -> Generator[bytes, None, None]:
+    compression_type = compressor['type']
+
+    if compression_type == 'none':
+        with open(content, 'rb') as file:
+            while chunk := file.read(CHUNK_SIZE):
+                yield chunk
+    elif compression_type == 'gzip':
+        yield from _compress_gzip(compressor, content)
+    elif compression_type in ('xz', 'zst'):
+        level, threads = int(compressor['level']), int(compressor['threads'])
+        if compression_type == 'xz':
+            command = ['xz', '-c', f'-{level}', f'-T{threads}']
+        else:
+            command = ['zstd', '-c', '-q', f'-{level}', '-T0' if threads == 0 else '--single-thread']
+        yield from _run_compressor(command, content)
+    else:
+        raise ValueError(f'Unsupported compressor {compression_type}')
+
+
+def _compress_gzip(compressor: dict[str, Any], content: str) -> Generator[bytes, None, None]:
+    # The header is stored, as it contains the name, time and operating system of the original compressor
+    compressed = zlib.compressobj(int(compressor['level']), zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = size = 0
+
+    yield bytes.fromhex(compressor['header'])
+
+    with open(content, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            crc, size = zlib.crc32(chunk, crc), size + len(chunk)
+            yield compressed.compress(chunk)
+
+    yield compressed.flush()
+    yield crc.to_bytes(4, 'little') + (size & 0xffffffff).to_bytes(4, 'little')
+
+
+def _run_compressor(command: list[str], content: str) -> Generator[bytes, None, None]:
+    with open(content, 'rb') as file, subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                       bufsize=0) as process:
+        assert process.stdin and process.stdout
+        feeder = threading.Thread(target=_feed, args=(file, process.stdin))
+        feeder.start()
+        completed = False
+
+        try:
+            while chunk := process.stdout.read(CHUNK_SIZE):
+                yield chunk
+
+            completed = True
+        finally:
+            if not completed:
+                process.kill()
+
+            process.stdout.close()
+            feeder.join()
+
+    if completed and process.returncode:
+        raise OSError(f'{command[0]} failed with return code {process.returncode}')
+
+
+def _feed(source: IO[bytes], target: IO[bytes]) -> None:
+    try:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+        target.close()
+    except BrokenPipeError:
+        pass
+
+
+def _create_patch(source: Optional[str], target: str, patch: str) -> int:
+    """Compresses the target as a binary diff against the source with zstd, returning the window size log."""
+    window_log = _get_window_log(getsize(source) if source else 0, getsize(target))
+    command = ['zstd', '-q', '-f', f'-{BLOB_LEVEL}', '-T0', f'--long={window_log}']
+
+    if source:
+        command.append(f'--patch-from={shlex.quote(source)}')
+
+    _run(command + [shlex.quote(target), '-o', shlex.quote(patch)])
+
+    return window_log
+
+
+def _apply_patch(source: Optional[str], patch: str, target: str, window_log: int) -> None:
+    command = ['zstd', '-q', '-f', '-d', f'--long={int(window_log)}']
+
+    if source:
+        command.append(f'--patch-from={shlex.quote(source)}')
+
+    _run(command + [shlex.quote(patch), '-o', shlex.quote(target)])
+
+
+def _get_window_log(*sizes: int) -> int:
+    # The window has to cover the source for the matches in it, zstd accepts 10 to 31
+    return min(max(sum(sizes).bit_length(), 20), 31)
+
+
+def _run(command: list[str]) -> None:
+    result = subprocess.run(' '.join(command), shell=True, stderr=subprocess.PIPE, text=True)
+
+    if result.returncode:
+        raise OSError(f"Command '{' '.join(command)}' failed with return code {result.returncode}: "
+                      f"{result.stderr.strip()}")
+
+
+def _extract_members(deb_file: str, directory: str) -> list[_Member]:
+    os.makedirs(directory, exist_ok=True)
+    members: list[_Member] = []
+
+    with open(deb_file, 'rb') as file:
+        if file.read(len(AR_MAGIC)) != AR_MAGIC:
+            raise ValueError(f'{deb_file} is not a .deb package')
+
+        while header := file.read(AR_HEADER_SIZE):
+            name = header[:16].decode().strip().rstrip('/')
+            size = int(header[48:58])
+            path = join(directory, f'{len(members)}-{basename(name)}')
+
+            with open(path, 'wb') as output:
+                digest = hashlib.sha256()
+
+                for chunk in _read_chunks(file, size):
+                    digest.update(chunk)
+                    output.write(chunk)
+
+            members.append(_Member(name, header, path, digest.hexdigest()))
+            file.seek(size % 2, os.SEEK_CUR)
+
+    return members
+
+
+def _decompress_member(member: _Member, path: str) -> str:
+    with open(member.path, 'rb') as file, open_member_content(file, member.name) as content, \
+            open(path, 'wb') as output:
+        shutil.copyfileobj(content, output, CHUNK_SIZE)
+
+    return path
+
+
+def _write_member(output: IO[bytes], entry: dict[str, Any], content: str) -> None:
+    header = entry['header'].encode('latin-1')
+    size = getsize(content)
+
+    if len(header) != AR_HEADER_SIZE or int(header[48:58]) != size:
+        raise ValueError(f"Invalid header of member {entry['name']}")
+
+    output.write(header)
+
+    with open(content, 'rb') as file:
+        shutil.copyfileobj(file, output, CHUNK_SIZE)
+
+    if size % 2:
+        output.write(b'\n')
+
+
+def _write_delta(delta_file: str, manifest: dict[str, Any], blobs: dict[str, str]) -> None:
+    # Magic, size of the compressed manifest, the manifest with the location of the blobs, then the blobs.
+    # Unlike an archive format this adds no padding, which would make the delta of small packages larger.
+    offset = 0
+    manifest['blobs'] = {}
+
+    for name, path in blobs.items():
+        manifest['blobs'][name] = [offset, getsize(path)]
+        offset += getsize(path)
+
+    content = zlib.compress(json.dumps(manifest, separators=(',', ':')).encode(), 9)
+    temp_file = f'{delta_file}.tmp'
+
+    try:
+        with open(temp_file, 'wb') as output:
+            output.write(DELTA_MAGIC + len(content).to_bytes(4, 'little') + content)
+
+            for path in blobs.values():
+                with open(path, 'rb') as blob:
+                    shutil.copyfileobj(blob, output, CHUNK_SIZE)
+
+        os.replace(temp_file, delta_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def _read_gzip_header(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        data = file.read(64 * 1024)
+
+    if data[:3] != b'\x1f\x8b\x08':
+        raise ValueError(f'{path} is not compressed with gzip')
+
+    flags, position = data[3], 10
+
+    if flags & 0x04:  # FEXTRA
+        position += 2 + int.from_bytes(data[position:position + 2], 'little')
+    for flag in (0x08, 0x10):  # FNAME, FCOMMENT
+        if flags & flag:
+            position = data.index(b'\0', position) + 1
+    if flags & 0x02:  # FHCRC
+        position += 2
+
+    return data[:position]
+
+
+def _add_operation(operations: list[list[Any]], kind: str, size: int, offset: Optional[int] = None) -> None:
+    # Adjacent operations are merged, copies only if they continue the previous copy in the old archive
+    if not size:
+        return
+
+    if operations and (last := operations[-1])[0] == kind and (kind != 'copy' or last[2] + last[1] == offset):
+        last[1] += size
+    else:
+        operations.append([kind, size] if offset is None else [kind, size, offset])
+
+
+def _copy_range(source: IO[bytes], offset: int, size: int, target: IO[bytes]) -> int:
+    source.seek(offset)
+
+    for chunk in _read_chunks(source, size):
+        target.write(chunk)
+
+    return size
+
+
+def _get_range_hash(file: IO[bytes], offset: int, size: int) -> str:
+    file.seek(offset)
+    digest = hashlib.sha256()
+
+    for chunk in _read_chunks(file, size):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _read_chunks(file: IO[bytes], size: int) -> Generator[bytes, None, None]:
+    while size > 0:
+        if not (chunk := file.read(min(size, CHUNK_SIZE))):
+            raise ValueError('Unexpected end of file')
+
+        size -= len(chunk)
+        yield chunk
+
+
+def _get_file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class _LimitedReader:
+
+    def __init__(self, file: IO[bytes], size: int) -> None:
+        self._file = file
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+
+        data = self._file.read(size)
+
+        if size and not data:
+            raise ValueError('Unexpected end of delta stream')
+
+        self._remaining -= len(data)
+        return data
+
+
+class _DeltaReader:
+
+    def __init__(self, delta_file: str) -> None:
+        self._file = open(delta_file, 'rb')
+
+        try:
+            if self._file.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+                raise ValueError(f'{delta_file} is not a package delta')
+
+            size = int.from_bytes(self._file.read(4), 'little')
+            self.manifest: dict[str, Any] = json.loads(zlib.decompress(self._file.read(size)))
+            self._data_offset = self._file.tell()
+
+            if self.manifest.get('format') != DELTA_FORMAT:
+                raise ValueError(f'{delta_file} is not a package delta of format {DELTA_FORMAT}')
+        except (ValueError, zlib.error) as error:
+            self._file.close()
+            raise ValueError(str(error)) from error
+
+    def __enter__(self) -> '_DeltaReader':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._file.close()
+
+    def extract(self, name: str, work_dir: str) -> str:
+        if name not in self.manifest['blobs']:
+            raise ValueError(f'Blob {name} is missing from the delta')
+
+        offset, size = self.manifest['blobs'][name]
+        # Extracted by name into the work directory, the names in the delta are never used as paths
+        path = join(work_dir, basename(name))
+
+        with open(path, 'wb') as output:
+            _copy_range(self._file, self._data_offset + offset, size, output)
+
+        return path
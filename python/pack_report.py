@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+from typing import Any, Generator, Optional
+
+
+class Report:
+    """Collects per-phase wall time, CPU time and peak memory usage of a packaging run.
+
+    CPU time includes both this process and its child processes. The peak RSS of child processes is a high-water mark,
+    as the kernel does not reset it between phases: it is the largest child that terminated until the end of the phase.
+    The output directory is only listed if the report is written to a file, to measure the bytes written to it.
+    """
+
+    def __init__(self, name: str, output_dir: Optional[str] = None, report_file: Optional[str] = None) -> None:
+        self.name = name
+        self.output_dir = output_dir
+        self.report_file = report_file
+        self.phases: list[dict[str, Any]] = []
+        self.artifacts: list[str] = []
+        self.children: list[dict[str, Any]] = []
+        self.import_times: dict[str, list[dict[str, Any]]] = {}
+        self._start = time.perf_counter()
+        self._start_cpu = _get_cpu_time()
+        self._output_files = _list_files(output_dir) if report_file else None
+
+    @contextmanager
+    def phase(self, name: str) -> Generator[dict[str, Any], None, None]:
+        """Measures the phase, the fields added to the yielded dictionary are recorded with the phase."""
+        start = time.perf_counter()
+        start_cpu = _get_cpu_time()
+        extra: dict[str, Any] = {}
+
+        try:
+            yield extra
+        finally:
+            self.add_phase(name, time.perf_counter() - start, _get_cpu_time() - start_cpu, _get_peak_rss(), **extra)
+
+    def add_phase(self, name: str, wall_time: float, cpu_time: float, peak_rss_kb: int,
+                  **extra: Any) -> dict[str, Any]:
+        phase = {
+            'name': name,
+            'wall_time': round(wall_time, 3),
+            'cpu_time': round(cpu_time, 3),
+            'peak_rss_kb': peak_rss_kb,
+            **extra,
+        }
+        self.phases.append(phase)
+        return phase
+
+    def add_artifacts(self, artifacts: list[str]) -> None:
+        self.artifacts.extend(artifacts)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'wall_time': round(time.perf_counter() - self._start, 3),
+            'cpu_time': round(_get_cpu_time() - self._start_cpu, 3),
+            'peak_rss_kb': _get_peak_rss(),
+            'process_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'output_bytes': self._get_output_bytes(),
+            'artifacts': [{'path': path, 'size': _get_size(path)} for path in self.artifacts],
+            'phases': self.phases,
+            'children': self.children,
+            'import_times': self.import_times,
+        }
+
+    def write(self) -> None:
+        if not self.report_file:
+            return
+
+        with open(self.report_file, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+            file.write('\n')
+
+    def _get_output_bytes(self) -> int:
+        if self._output_files is None:
+            return 0
+
+        files = _list_files(self.output_dir)
+        return sum(size for path, (size, mtime) in files.items() if self._output_files.get(path) != (size, mtime))
+
+
+def read_report(report_file: str) -> Optional[dict[str, Any]]:
+    try:
+        with open(report_file, 'r') as file:
+            report: dict[str, Any] = json.load(file)
+            return report
+    except (OSError, ValueError):
+        return None
+
+
+def _get_cpu_time() -> float:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    process = resource.getrusage(resource.RUSAGE_SELF)
+    return children.ru_utime + children.ru_stime + process.ru_utime + process.ru_stime
+
+
+def _get_peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def _get_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def _list_files(directory: Optional[str]) -> dict[str, tuple[int, int]]:
+    files: dict[str, tuple[int, int]] = {}
+
+    if not directory:
+        return files
+
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.lstat(path)
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+
+    return files
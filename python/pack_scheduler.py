@@ -0,0 +1,339 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import fcntl
+import itertools
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from os.path import isdir, join
+from typing import Any, Generator, Optional
+
+from pack_common import CACHE_ROOT
+
+DEFAULT_SCHEDULER_DIR = f'{CACHE_ROOT}/scheduler'
+# Share of the memory of the host admitted to the jobs by default
+DEFAULT_MEMORY_SHARE = 0.8
+# Footprint of a packaging script never run before
+DEFAULT_FOOTPRINT_CPU_CORES = 1.0
+DEFAULT_FOOTPRINT_RSS_KB = 512 * 1024
+# Number of recent runs the footprint of a packaging script is learned from
+FOOTPRINT_SAMPLES = 10
+
+LEASES_FILE = 'leases.json'
+FOOTPRINTS_FILE = 'footprints.json'
+LOCK_FILE = '.lock'
+
+# Marks the processes of a job, inherited by all processes the packaging script runs
+JOB_VARIABLE = 'PACK_PYTHON_JOB'
+JOB_PATTERN = re.compile(rb'(?:^|\0)' + JOB_VARIABLE.encode() + rb'=([^\0]*)')
+
+SAMPLE_INTERVAL = 0.5
+POLL_INTERVAL = 0.5
+
+
+@dataclass
+class Footprint:
+    cpu_cores: float
+    peak_rss_kb: int
+
+
+@dataclass
+class Lease:
+    """The resources admitted to a job, the job runs its builds with the given parallelism."""
+
+    id: str
+    name: str
+    workspace: str
+    footprint: Footprint
+    parallel: int
+    start: float = field(default_factory=time.perf_counter)
+    start_cpu: float = field(default_factory=time.thread_time)
+
+    def get_environment(self) -> dict[str, str]:
+        """Returns the environment variables passing the parallelism of the job to the builds it runs."""
+        options = [option for option in os.environ.get('DEB_BUILD_OPTIONS', '').split()
+                   if not option.startswith('parallel=')]
+        flags = [flag for flag in os.environ.get('MAKEFLAGS', '').split() if not re.match(r'^-j\d*$', flag)]
+
+        return {
+            JOB_VARIABLE: self.id,
+            'DEB_BUILD_OPTIONS': ' '.join([*options, f'parallel={self.parallel}']),
+            'MAKEFLAGS': ' '.join([*flags, f'-j{self.parallel}']),
+        }
+
+
+class JobScheduler:
+    """Admits the packaging jobs of all pack_python processes of the host against a CPU and memory budget.
+
+    The footprint of a job is learned from the previous runs of the same packaging script on the same workspace:
+    the CPU cores used on average and the peak of the summed resident memory of its processes, sampled from /proc.
+    The admitted jobs are recorded in a file shared by the processes, so concurrent builds do not oversubscribe
+    the host. A job is always admitted if no other job is running, even if it does not fit into the budget.
+    """
+
+    def __init__(self, scheduler_dir: str = DEFAULT_SCHEDULER_DIR, cpus: Optional[int] = None,
+                 memory_kb: Optional[int] = None) -> None:
+        self.scheduler_dir = scheduler_dir
+        self.cpus = cpus or os.cpu_count() or 1
+        self.memory_kb = memory_kb or int(_read_meminfo('MemTotal') * DEFAULT_MEMORY_SHARE)
+        self._ids = itertools.count()
+        self._queue: deque[int] = deque()
+        self._condition = threading.Condition()
+        self._usages: dict[str, _Usage] = {}
+        self._sampler: Optional[threading.Thread] = None
+        # Process environments do not change, the job of a process is read once
+        self._process_jobs: dict[tuple[int, str], Optional[str]] = {}
+
+    def acquire(self, name: str, workspace: str) -> Lease:
+        """Waits until the job fits into the budget, the jobs of this process are admitted in order."""
+        footprint = self.get_footprint(name, workspace)
+        ticket = next(self._ids)
+
+        with self._condition:
+            self._queue.append(ticket)
+
+        try:
+            while not (lease := self._try_acquire(ticket, name, workspace, footprint)):
+                with self._condition:
+                    self._condition.wait(POLL_INTERVAL)
+        finally:
+            with self._condition:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+        print(f'Admitted {name} with parallel={lease.parallel}, expecting {footprint.cpu_cores:.1f} CPU cores '
+              f'and {footprint.peak_rss_kb // 1024} MiB', file=sys.stderr)
+
+        with self._condition:
+            self._usages[lease.id] = _Usage()
+
+            if not self._sampler:
+                self._sampler = threading.Thread(target=self._sample_jobs, daemon=True)
+                self._sampler.start()
+
+        return lease
+
+    def release(self, lease: Lease, learn: bool = True) -> Footprint:
+        """Releases the resources of the job, returning its measured footprint, which is learned if requested."""
+        wall_time = time.perf_counter() - lease.start
+
+        with self._condition:
+            self._sample()
+            usage = self._usages.pop(lease.id)
+            self._condition.notify_all()
+
+        # The packaging scripts run in-process are measured by the CPU time of the thread of the job
+        cpu_time = usage.cpu_ticks / os.sysconf('SC_CLK_TCK') + time.thread_time() - lease.start_cpu
+        footprint = Footprint(round(cpu_time / max(wall_time, SAMPLE_INTERVAL), 2), usage.peak_rss_kb)
+
+        with self._lock():
+            leases = self._read(LEASES_FILE)
+            leases.pop(lease.id, None)
+            self._write(LEASES_FILE, leases)
+
+            if learn:
+                footprints = self._read(FOOTPRINTS_FILE)
+                samples = footprints.setdefault(lease.name, {}).setdefault(lease.workspace, [])
+                samples[:] = [*samples, asdict(footprint)][-FOOTPRINT_SAMPLES:]
+                self._write(FOOTPRINTS_FILE, footprints)
+
+        return footprint
+
+    def get_footprint(self, name: str, workspace: str) -> Footprint:
+        """Returns the expected footprint, the median CPU cores and the largest peak memory of the recent runs.
+        Without runs on the workspace the runs on any workspace are used, without any runs the default footprint."""
+        with self._lock():
+            workspaces: dict[str, list[dict[str, Any]]] = self._read(FOOTPRINTS_FILE).get(name, {})
+
+        samples = workspaces.get(workspace) or [sample for samples in workspaces.values() for sample in samples]
+
+        if not samples:
+            return Footprint(DEFAULT_FOOTPRINT_CPU_CORES, DEFAULT_FOOTPRINT_RSS_KB)
+
+        return Footprint(statistics.median(sample['cpu_cores'] for sample in samples),
+                         max(sample['peak_rss_kb'] for sample in samples))
+
+    def _try_acquire(self, ticket: int, name: str, workspace: str, footprint: Footprint) -> Optional[Lease]:
+        with self._condition:
+            if self._queue[0] != ticket:
+                return None
+
+            waiting = len(self._queue)
+
+        with self._lock():
+            leases = {job: lease for job, lease in self._read(LEASES_FILE).items() if _is_running(lease['pid'])}
+            free_cpus = self.cpus - sum(lease['cpus'] for lease in leases.values())
+            free_memory_kb = self.memory_kb - sum(lease['rss_kb'] for lease in leases.values())
+            cpus = max(1, math.ceil(footprint.cpu_cores))
+
+            if leases and (cpus > free_cpus or footprint.peak_rss_kb > min(free_memory_kb,
+                                                                           _read_meminfo('MemAvailable'))):
+                return None
+
+            # The free cores are shared by the jobs waiting in this process, a job gets at least its footprint.
+            # Only the footprint is reserved, a build using the parallelism reserves more cores on its next run.
+            parallel = max(1, min(max(cpus, free_cpus // waiting), free_cpus))
+            lease = Lease(f'{os.getpid()}-{ticket}', name, workspace, footprint, parallel)
+            leases[lease.id] = {'pid': os.getpid(), 'name': name, 'cpus': cpus, 'rss_kb': footprint.peak_rss_kb}
+            self._write(LEASES_FILE, leases)
+
+        return lease
+
+    def _sample_jobs(self) -> None:
+        while True:
+            with self._condition:
+                if not self._usages:
+                    self._sampler = None
+                    return
+
+                self._sample()
+                self._condition.wait(SAMPLE_INTERVAL)
+
+    def _sample(self) -> None:
+        processes = _read_job_processes(self._process_jobs)
+
+        for job, usage in self._usages.items():
+            usage.add_sample({pid: process for pid, process in processes.items() if process.job == job})
+
+    @contextmanager
+    def _lock(self) -> Generator[None, None, None]:
+        os.makedirs(self.scheduler_dir, exist_ok=True)
+
+        with open(join(self.scheduler_dir, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _read(self, name: str) -> dict[str, Any]:
+        try:
+            with open(join(self.scheduler_dir, name), 'r') as file:
+                content: dict[str, Any] = json.load(file)
+                return content
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, name: str, content: dict[str, Any]) -> None:
+        temp_file = join(self.scheduler_dir, f'.{name}.{os.getpid()}')
+
+        with open(temp_file, 'w') as file:
+            json.dump(content, file, indent=2)
+
+        os.replace(temp_file, join(self.scheduler_dir, name))
+
+
+@dataclass
+class _Process:
+    parent: int
+    job: Optional[str]
+    cpu_ticks: int
+    rss_kb: int
+
+
+@dataclass
+class _Usage:
+    """The CPU time and the peak memory of the processes of a job, accumulated over the samples."""
+
+    cpu_ticks: int = 0
+    peak_rss_kb: int = 0
+    _cpu_ticks: dict[int, int] = field(default_factory=dict)
+    _parents: dict[int, int] = field(default_factory=dict)
+
+    def add_sample(self, processes: dict[int, _Process]) -> None:
+        for pid, process in processes.items():
+            self.cpu_ticks += process.cpu_ticks - self._cpu_ticks.get(pid, 0)
+
+        # The CPU time of an exited process is added to its parent when it is reaped, the part already counted
+        # is subtracted from the parent. The last moments of processes exiting between the samples are not counted.
+        for pid, cpu_ticks in self._cpu_ticks.items():
+            if pid not in processes and self._parents[pid] in processes:
+                self.cpu_ticks -= cpu_ticks
+
+        self._cpu_ticks = {pid: process.cpu_ticks for pid, process in processes.items()}
+        self._parents = {pid: process.parent for pid, process in processes.items()}
+        self.peak_rss_kb = max(self.peak_rss_kb, sum(process.rss_kb for process in processes.values()))
+
+
+def _read_job_processes(process_jobs: dict[tuple[int, str], Optional[str]]) -> dict[int, _Process]:
+    """Returns the descendant processes of this process with the job marking them, the jobs of the processes
+    already seen are taken from and the jobs of the new processes are added to the given dictionary."""
+    if not isdir('/proc'):
+        return {}
+
+    page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+    stats: dict[int, list[str]] = {}
+
+    for name in os.listdir('/proc'):
+        try:
+            if name.isdigit():
+                with open(f'/proc/{name}/stat', 'r') as file:
+                    stat = file.read()
+
+                # The fields following the command name, which may contain spaces, starting with the state
+                stats[int(name)] = stat[stat.rindex(')') + 2:].split()
+        except (OSError, ValueError):
+            pass
+
+    children: dict[int, list[int]] = {}
+
+    for pid, fields in stats.items():
+        children.setdefault(int(fields[1]), []).append(pid)
+
+    processes = {}
+    pending = list(children.get(os.getpid(), []))
+    seen_jobs = dict(process_jobs)
+    process_jobs.clear()
+
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        fields = stats[pid]
+        # The start time tells apart the processes reusing the same process ID
+        key = (pid, fields[19])
+        process_jobs[key] = seen_jobs[key] if key in seen_jobs else _read_job(pid)
+        processes[pid] = _Process(int(fields[1]), process_jobs[key], sum(int(value) for value in fields[11:15]),
+                                  int(fields[21]) * page_kb)
+
+    return processes
+
+
+def _read_job(pid: int) -> Optional[str]:
+    try:
+        with open(f'/proc/{pid}/environ', 'rb') as file:
+            match = JOB_PATTERN.search(file.read())
+    except OSError:
+        return None
+
+    return match.group(1).decode() if match else None
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def _read_meminfo(key: str) -> int:
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith(f'{key}:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+
+    # Without /proc the memory is not limited
+    return sys.maxsize
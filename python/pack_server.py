@@ -0,0 +1,227 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import contextvars
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+from typing import IO, Any, Callable, Optional, Sequence
+
+from pack_common import CACHE_ROOT, get_command_umask, script_environment
+
+DEFAULT_SOCKET = f"{os.environ.get('XDG_RUNTIME_DIR', CACHE_ROOT)}/pack_python.sock"
+SOCKET_ENVIRONMENT = 'PACK_PYTHON_SOCKET'
+
+# Writes the output of the request handled by the current thread, None outside of requests
+_output: contextvars.ContextVar[Optional[Callable[[str, str], None]]] = contextvars.ContextVar('output', default=None)
+
+Handler = Callable[[list[str], str], int]
+
+
+class PackServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Runs packaging requests received on a Unix socket, with at most the given number of requests at a time.
+
+    A request is a JSON line with the command line arguments, the working directory, the environment and the umask of
+    the client. The environment and the umask are applied to the packaging scripts run for the request.
+    The stdout and stderr output of the request is streamed back as JSON lines, followed by the return code.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, workers: int, handler: Handler) -> None:
+        self.socket_path = socket_path
+        self.handler = handler
+        self.workers = threading.BoundedSemaphore(workers)
+
+        _remove_stale_socket(socket_path)
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+        # Only the user running the server can connect
+        umask = os.umask(0o077)
+
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def serve(self) -> None:
+        _redirect_output()
+
+        # exit() closes sys.stdin, which must not close the file descriptor 0 of the server
+        sys.stdin = open(os.devnull, 'r')
+
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+        print(f'Serving packaging requests on {self.socket_path}', file=sys.stderr)
+
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            os.remove(self.socket_path)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: PackServer
+
+    def handle(self) -> None:
+        lock = threading.Lock()
+
+        def send(message: dict[str, Any]) -> None:
+            with lock:
+                try:
+                    self.wfile.write(json.dumps(message).encode() + b'\n')
+                    self.wfile.flush()
+                except OSError:
+                    # The client is gone, the request is finished regardless
+                    pass
+
+        request = json.loads(self.rfile.readline())
+
+        with self.server.workers:
+            context = contextvars.copy_context()
+            context.run(_output.set, lambda stream, data: send({'stream': stream, 'data': data}))
+            returncode = context.run(_handle, self.server.handler, request)
+
+        send({'returncode': returncode})
+
+
+def request(socket_path: str, arguments: Sequence[str], cwd: str) -> int:
+    """Sends the request to the server and writes its output to stdout and stderr, returns its return code."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+
+        with client.makefile('rwb') as connection:
+            message = {'arguments': list(arguments), 'cwd': cwd, 'environment': dict(os.environ), 'umask': _get_umask()}
+            connection.write(json.dumps(message).encode() + b'\n')
+            connection.flush()
+
+            for line in connection:
+                message = json.loads(line)
+
+                if 'returncode' in message:
+                    return int(message['returncode'])
+
+                stream = sys.stdout if message['stream'] == 'stdout' else sys.stderr
+                stream.write(message['data'])
+                stream.flush()
+
+    print(f'Connection to {socket_path} closed without a return code', file=sys.stderr)
+    return 1
+
+
+def is_serving() -> bool:
+    return _output.get() is not None
+
+
+def run_process(command: list[str], env: Optional[dict[str, str]] = None) -> subprocess.CompletedProcess[str]:
+    """Runs the command capturing its stdout, with its stderr forwarded to the client of the current request."""
+    with subprocess.Popen(command, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                          umask=get_command_umask()) as process:
+        stderr = process.stderr
+        assert stderr is not None
+        forwarder = threading.Thread(target=contextvars.copy_context().run, args=(_forward, stderr, sys.stderr))
+        forwarder.start()
+        stdout = process.stdout.read() if process.stdout else ''
+        forwarder.join()
+
+    return subprocess.CompletedProcess(command, process.returncode, stdout)
+
+
+def _handle(handler: Handler, request: dict[str, Any]) -> int:
+    try:
+        # Requests of older clients do not have an environment and umask
+        with script_environment(request.get('environment', {}), request.get('umask')):
+            return handler(request['arguments'], request['cwd'])
+    except SystemExit as error:
+        if isinstance(error.code, str):
+            print(error.code, file=sys.stderr)
+            return 1
+
+        return error.code or 0
+    except Exception as error:
+        print(f'Packaging request failed: {error!r}', file=sys.stderr)
+        return 1
+
+
+def _get_umask() -> int:
+    # The umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return umask
+
+
+def _forward(source: IO[str], target: IO[str]) -> None:
+    for line in source:
+        target.write(line)
+
+
+def _redirect_output() -> None:
+    sys.stdout = _RequestStream('stdout', sys.stdout)
+    sys.stderr = _RequestStream('stderr', sys.stderr)
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+
+    print(f'Another server is already listening on {socket_path}', file=sys.stderr)
+    exit(1)
+
+
+class _RequestStream:
+    """Text stream writing to the client of the request handled by the current thread, or to the original stream."""
+
+    def __init__(self, name: str, original: IO[str]) -> None:
+        self.name = name
+        self.original = original
+
+    def write(self, data: str) -> int:
+        if output := _output.get():
+            output(self.name, data)
+        else:
+            self.original.write(data)
+
+        return len(data)
+
+    def flush(self) -> None:
+        if not _output.get():
+            self.original.flush()
+
+    @property
+    def buffer(self) -> Any:
+        # The output of the commands run by packaging scripts in-process is written as bytes
+        return _RequestBuffer(self) if _output.get() else getattr(self.original, 'buffer')
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.original, name)
+
+
+class _RequestBuffer:
+    """Binary stream decoding the data written to it to the text stream of the request."""
+
+    def __init__(self, stream: _RequestStream) -> None:
+        self.stream = stream
+
+    def write(self, data: bytes) -> int:
+        self.stream.write(data.decode(errors='replace'))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
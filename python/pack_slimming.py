@@ -0,0 +1,173 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import fnmatch
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+from configparser import ConfigParser
+from dataclasses import dataclass
+from os.path import exists, islink, join, relpath
+from typing import Optional
+
+ACTIONS = ['remove', 'strip']
+ELF_MAGIC = b'\x7fELF'
+
+# The default profile, the rules are applied in this order
+DEFAULT_PROFILE = [
+    'bytecode remove */__pycache__',
+    'tests remove */site-packages/*/tests',
+    'docs remove */site-packages/*/docs */site-packages/*/doc share/doc share/man share/info',
+    'build-tools remove */site-packages/pip */site-packages/pip-*.dist-info */site-packages/setuptools '
+    '*/site-packages/setuptools-*.dist-info */site-packages/pkg_resources */site-packages/_distutils_hack '
+    '*/site-packages/distutils-precedence.pth */site-packages/wheel */site-packages/wheel-*.dist-info '
+    'bin/pip bin/pip3 bin/pip3.* bin/wheel bin/easy_install bin/easy_install-*',
+    'debug-symbols strip */site-packages/*.so */site-packages/*.so.*',
+]
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A slimming rule, written as: <name> <action> <pattern> [<pattern> ...]
+
+    The patterns are glob patterns matched against the paths relative to the slimmed directory, * matching / as well.
+    The remove action deletes the matching files and directories, the strip action removes the debug symbols
+    of the matching ELF files with strip --strip-debug.
+    """
+
+    name: str
+    action: str
+    patterns: tuple[str, ...]
+
+    def matches(self, path: str) -> bool:
+        return any(fnmatch.fnmatchcase(path, pattern) for pattern in self.patterns)
+
+    def __str__(self) -> str:
+        return ' '.join([self.name, self.action, *self.patterns])
+
+
+@dataclass
+class RuleResult:
+    files: int = 0
+    saved_bytes: int = 0
+
+
+def parse_rule(text: str) -> Rule:
+    try:
+        words = shlex.split(text)
+    except ValueError as error:
+        raise ValueError(f'Invalid slimming rule {text!r}: {error}')
+
+    if len(words) < 3 or words[1] not in ACTIONS or words[0].startswith('-'):
+        raise ValueError(f'Invalid slimming rule {text!r}, expected: <name> <action> <pattern> [<pattern> ...] '
+                         f'with action one of {", ".join(ACTIONS)}')
+
+    return Rule(words[0], words[1], tuple(pattern.strip('/') for pattern in words[2:]))
+
+
+def get_rules(lines: list[str]) -> list[Rule]:
+    """Returns the rules of the default profile changed by the given lines in order. A rule replaces the rule
+    of the same name or is appended, a line of -<name pattern> drops the matching rules, e.g. -* drops all of them."""
+    rules = {rule.name: rule for rule in map(parse_rule, DEFAULT_PROFILE)}
+
+    for line in map(str.strip, lines):
+        if line.startswith('-'):
+            rules = {name: rule for name, rule in rules.items() if not fnmatch.fnmatchcase(name, line[1:])}
+        elif line:
+            rule = parse_rule(line)
+            rules[rule.name] = rule
+
+    return list(rules.values())
+
+
+def read_rule_lines(config_file: str) -> list[str]:
+    """Reads the lines of the slim-rules option of the [pack-python] section, one rule per line."""
+    if not exists(config_file):
+        return []
+
+    parser = ConfigParser()
+    parser.read(config_file)
+
+    if not parser.has_option('pack-python', 'slim-rules'):
+        return []
+
+    return [line for line in parser.get('pack-python', 'slim-rules').splitlines() if line.strip()]
+
+
+def apply_rule(rule: Rule, root_dir: str) -> RuleResult:
+    """Applies the rule to the files under the root directory, returning the number of files removed or stripped
+    and the bytes saved."""
+    result = RuleResult()
+
+    for root, directories, files in os.walk(root_dir):
+        directories.sort()
+
+        for directory in list(directories):
+            path = join(root, directory)
+
+            if rule.action == 'remove' and rule.matches(relpath(path, root_dir)):
+                directories.remove(directory)
+                _add(result, *_get_tree_size(path))
+
+                if islink(path):
+                    os.unlink(path)
+                else:
+                    shutil.rmtree(path)
+
+        for name in sorted(files):
+            path = join(root, name)
+
+            if not rule.matches(relpath(path, root_dir)):
+                continue
+
+            if rule.action == 'remove':
+                _add(result, 1, os.lstat(path).st_size)
+                os.unlink(path)
+            elif (saved := _strip(path)) is not None:
+                _add(result, 1, saved)
+
+    return result
+
+
+def _strip(path: str) -> Optional[int]:
+    # Only regular ELF files are stripped. The vendored libraries of repaired wheels in the <package>.libs directories
+    # are patched with patchelf, which strip is known to break, so they are left intact.
+    if islink(path) or any(part.endswith('.libs') for part in path.split('/')[:-1]):
+        return None
+
+    with open(path, 'rb') as file:
+        if file.read(len(ELF_MAGIC)) != ELF_MAGIC:
+            return None
+
+    size = os.path.getsize(path)
+    result = subprocess.run(['strip', '--strip-debug', path], text=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+
+    if result.returncode:
+        print(f'Failed to strip {path}: {result.stdout.strip()}', file=sys.stderr)
+        return None
+
+    return size - os.path.getsize(path)
+
+
+def _get_tree_size(path: str) -> tuple[int, int]:
+    if islink(path) or not os.path.isdir(path):
+        return 1, os.lstat(path).st_size
+
+    files = 0
+    size = 0
+
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.lstat(join(root, name)).st_size
+
+    return files, size
+
+
+def _add(result: RuleResult, files: int, saved_bytes: int) -> None:
+    result.files += files
+    result.saved_bytes += saved_bytes
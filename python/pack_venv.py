@@ -0,0 +1,205 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import fcntl
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from os.path import exists, islink, isdir, join, normpath, realpath, relpath
+from typing import Generator, Optional
+
+from pack_cache import get_tool_version
+from pack_common import CACHE_ROOT, run_command
+
+DEFAULT_POOL_DIR = f'{CACHE_ROOT}/venvs'
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_AGE_DAYS = 7
+
+TEMPLATE_FILE = 'template.json'
+VENV_DIR = 'venv'
+
+# pip settings which change the resolved versions of the requirements
+PIP_ENVIRONMENT = ['PIP_INDEX_URL', 'PIP_EXTRA_INDEX_URL', 'PIP_FIND_LINKS', 'PIP_NO_INDEX']
+
+# ioctl creating a copy-on-write clone of a file, on file systems supporting it (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+class VenvPool:
+    """Pool of virtualenv templates pre-populated with the requirements, keyed by the requirements and the interpreter.
+
+    A template is rebuilt when it is older than max_age, as unpinned requirements resolve to newer versions over time,
+    or when its interpreter is gone. The least recently used templates are evicted above the pool size.
+    """
+
+    def __init__(self, pool_dir: str = DEFAULT_POOL_DIR, size: int = DEFAULT_POOL_SIZE,
+                 max_age: float = DEFAULT_MAX_AGE_DAYS * 24 * 3600) -> None:
+        self.pool_dir = pool_dir
+        self.size = size
+        self.max_age = max_age
+
+    def get_key(self, requirements: list[str], python_bin: str, env: Optional[dict[str, str]] = None) -> str:
+        env = env if env is not None else dict(os.environ)
+        digest = hashlib.sha256()
+
+        digest.update(json.dumps({
+            'requirements': sorted(set(requirements)),
+            'python': [realpath(shutil.which(python_bin) or python_bin), get_tool_version((python_bin, '-VV'))],
+            'pip': {name: env[name] for name in PIP_ENVIRONMENT if name in env},
+        }, sort_keys=True).encode())
+
+        return digest.hexdigest()
+
+    def get_template(self, requirements: list[str], python_bin: str, env: Optional[dict[str, str]] = None,
+                     log_file: Optional[str] = None) -> str:
+        """Returns the virtualenv of the template with the requirements installed, creating it if needed."""
+        key = self.get_key(requirements, python_bin, env)
+        template_dir = join(self.pool_dir, key)
+
+        # Concurrent builds with the same requirements wait for the template created by the first one
+        with self._lock(key):
+            if isdir(template_dir) and not self._is_valid(template_dir):
+                print(f'Removing stale virtualenv template {template_dir}', file=sys.stderr)
+                shutil.rmtree(template_dir, ignore_errors=True)
+
+            if isdir(template_dir):
+                print(f'Using virtualenv template {template_dir}', file=sys.stderr)
+            else:
+                self._create(template_dir, requirements, python_bin, env, log_file)
+
+            # Directory modification time is used as the last access time for LRU eviction
+            os.utime(template_dir)
+
+        self.evict()
+
+        return join(template_dir, VENV_DIR)
+
+    def evict(self) -> None:
+        if not isdir(self.pool_dir):
+            return
+
+        entries = sorted(((entry.stat().st_mtime, entry.path) for entry in os.scandir(self.pool_dir)
+                          if entry.is_dir()), reverse=True)
+        templates = [path for _, path in entries if not os.path.basename(path).startswith('.')]
+
+        for path in templates[self.size:]:
+            print(f'Evicting virtualenv template {path}', file=sys.stderr)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _is_valid(self, template_dir: str) -> bool:
+        try:
+            with open(join(template_dir, TEMPLATE_FILE), 'r') as file:
+                created = float(json.load(file)['created'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        return time.time() - created <= self.max_age and exists(realpath(join(template_dir, VENV_DIR, 'bin/python')))
+
+    def _create(self, template_dir: str, requirements: list[str], python_bin: str, env: Optional[dict[str, str]],
+                log_file: Optional[str]) -> None:
+        # Created in place, as the virtualenv records its path in the activate scripts and the console scripts
+        venv_dir = join(template_dir, VENV_DIR)
+
+        try:
+            os.makedirs(template_dir)
+
+            command = [shlex.quote(python_bin), '-m', 'venv', shlex.quote(venv_dir)]
+            list(run_command(self.pool_dir, command, '(?!)', env=env, log_file=log_file))
+
+            if requirements:
+                requirements_file = join(template_dir, 'requirements.txt')
+
+                with open(requirements_file, 'w') as file:
+                    file.write('\n'.join(requirements) + '\n')
+
+                command = [shlex.quote(f'{venv_dir}/bin/python'), '-m', 'pip', 'install', '--disable-pip-version-check',
+                           '-r', shlex.quote(requirements_file)]
+                list(run_command(self.pool_dir, command, '(?!)', env=env, log_file=log_file))
+
+            # Written last, a template without it is incomplete and is rebuilt
+            with open(join(template_dir, TEMPLATE_FILE), 'w') as file:
+                json.dump({'created': time.time(), 'python': python_bin, 'requirements': requirements}, file)
+        except BaseException:
+            shutil.rmtree(template_dir, ignore_errors=True)
+            raise
+
+    @contextmanager
+    def _lock(self, key: str) -> Generator[None, None, None]:
+        os.makedirs(self.pool_dir, exist_ok=True)
+
+        with open(join(self.pool_dir, f'.{key}.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+
+def clone_venv(template: str, target: str, venv_dir: str) -> None:
+    """Clones the virtualenv template to target, replacing the path of the template with venv_dir in the scripts.
+
+    The activate scripts and the shebangs of the console scripts contain the absolute path of the virtualenv. The clone
+    is moved to venv_dir for the build, where dh_virtualenv translates them to the install path, as in the virtualenvs
+    it creates itself.
+    """
+    clone_tree(template, target)
+
+    for entry in os.scandir(join(target, 'bin')):
+        if entry.is_file(follow_symlinks=False):
+            _replace_path(entry.path, template, venv_dir)
+
+
+def clone_tree(source: str, target: str) -> None:
+    """Copies the virtualenv, sharing the file data with the template if the file system supports reflinks.
+
+    Files are never hardlinked, as the build modifies some of them in place (e.g. strip, dh_strip and dh_fixperms),
+    which would change the template as well.
+    """
+    reflink = True
+
+    for root, dirs, files in os.walk(source):
+        target_root = normpath(join(target, relpath(root, source)))
+        os.makedirs(target_root, exist_ok=True)
+
+        for name in [name for name in dirs if islink(join(root, name))] + files:
+            path, target_path = join(root, name), join(target_root, name)
+
+            if islink(path):
+                os.symlink(os.readlink(path), target_path)
+                dirs[:] = [directory for directory in dirs if directory != name]
+            elif reflink and _reflink(path, target_path):
+                continue
+            else:
+                reflink = False
+                shutil.copy2(path, target_path)
+
+        shutil.copystat(root, target_root)
+
+
+def _replace_path(file: str, old: str, new: str) -> None:
+    with open(file, 'rb') as source:
+        content = source.read()
+
+    # Binaries are left as is, e.g. a copied interpreter
+    if old.encode() not in content or b'\0' in content:
+        return
+
+    # The clone does not share its data with the template, so it is rewritten in place
+    with open(file, 'wb') as target:
+        target.write(content.replace(old.encode(), new.encode()))
+
+
+def _reflink(source: str, target: str) -> bool:
+    try:
+        with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        if exists(target):
+            os.remove(target)
+        return False
+
+    shutil.copystat(source, target)
+    return True
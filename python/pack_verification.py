@@ -0,0 +1,238 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import fnmatch
+import os
+import re
+import shlex
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from dataclasses import dataclass, field
+from email.parser import HeaderParser
+from os.path import basename, exists, isdir, join
+from typing import Callable, Optional
+
+from pack_deb import iter_deb_members, open_tar_member, parse_control
+
+ARTIFACT_PATTERNS = ['*.deb', '*.whl']
+CHECKS = ['file', 'no-file', 'control', 'script', 'unit']
+OPERATORS = ['=', '~']
+
+UNIT_PATTERN = re.compile(r'(?:^|/)(?:usr/)?lib/systemd/system/[^/]+$|(?:^|/)etc/systemd/system/[^/]+$')
+
+
+@dataclass
+class Artifact:
+    """The content of a package needed for the verification, read in a single pass over the package.
+
+    The fields are the control fields of a .deb package or the METADATA headers of a wheel,
+    the control files are the members of the control archive of a .deb package or the dist-info files of a wheel.
+    """
+
+    path: str
+    files: list[str] = field(default_factory=list)
+    fields: dict[str, str] = field(default_factory=dict)
+    control_files: dict[str, str] = field(default_factory=dict)
+    units: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A verification rule, written as: <artifact pattern> <check> <subject> [<operator> <value>]
+
+    The file and no-file checks match the subject as a glob pattern against the file list of the artifact.
+    The control, script and unit checks require the control field, the control file or the systemd unit to exist,
+    and with the = operator to be equal to, with the ~ operator to contain the value.
+    """
+
+    pattern: str
+    check: str
+    subject: str
+    operator: Optional[str] = None
+    value: Optional[str] = None
+
+    def applies_to(self, artifact_path: str) -> bool:
+        return fnmatch.fnmatch(basename(artifact_path), self.pattern)
+
+    def verify(self, artifact: Artifact) -> Optional[str]:
+        """Returns the reason of the failure, or None if the artifact satisfies the rule."""
+        if self.check in ('file', 'no-file'):
+            matches = fnmatch.filter(artifact.files, self.subject.lstrip('/'))
+
+            if self.check == 'file' and not matches:
+                return f'no file matches {self.subject}'
+            elif self.check == 'no-file' and matches:
+                return f'unexpected files match {self.subject}: {", ".join(matches[:5])}'
+
+            return None
+
+        description, contents = {
+            'control': ('control field', artifact.fields),
+            'script': ('control file', artifact.control_files),
+            'unit': ('systemd unit', artifact.units),
+        }[self.check]
+
+        if (content := contents.get(self.subject)) is None:
+            return f'missing {description} {self.subject}'
+        elif self.operator == '=' and content.strip() != self.value:
+            return f'{description} {self.subject} is {content.strip()!r}, expected {self.value!r}'
+        elif self.operator == '~' and (self.value or '') not in content:
+            return f'{description} {self.subject} does not contain {self.value!r}'
+
+        return None
+
+    def __str__(self) -> str:
+        words = [self.pattern, self.check, self.subject]
+
+        if self.operator:
+            words.extend([self.operator, self.value or ''])
+
+        return ' '.join(words)
+
+
+def parse_rule(text: str) -> Rule:
+    try:
+        words = shlex.split(text)
+    except ValueError as error:
+        raise ValueError(f'Invalid verification rule {text!r}: {error}')
+
+    if len(words) < 3 or words[1] not in CHECKS:
+        raise ValueError(f'Invalid verification rule {text!r}, expected: <artifact pattern> <check> <subject> '
+                         f'[<operator> <value>] with check one of {", ".join(CHECKS)}')
+
+    pattern, check, subject, *comparison = words
+
+    if not comparison:
+        return Rule(pattern, check, subject)
+
+    if comparison[0] not in OPERATORS or len(comparison) < 2 or check in ('file', 'no-file'):
+        raise ValueError(f'Invalid comparison in verification rule {text!r}, '
+                         f'expected one of {", ".join(OPERATORS)} followed by the value for control, script and unit')
+
+    return Rule(pattern, check, subject, comparison[0], ' '.join(comparison[1:]))
+
+
+def read_rules(config_file: str) -> list[Rule]:
+    """Reads the verification rules of the verify option of the [pack-python] section, one rule per line."""
+    if not exists(config_file):
+        return []
+
+    parser = ConfigParser()
+    parser.read(config_file)
+
+    if not parser.has_option('pack-python', 'verify'):
+        return []
+
+    return [parse_rule(line) for line in parser.get('pack-python', 'verify').splitlines() if line.strip()]
+
+
+def find_artifacts(paths: list[str]) -> list[str]:
+    """Returns the given package files and the packages found in the given directories, recursively."""
+    artifacts = []
+
+    for path in paths:
+        if not isdir(path):
+            artifacts.append(path)
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            artifacts.extend(join(root, name) for name in sorted(files)
+                             if any(fnmatch.fnmatch(name, pattern) for pattern in ARTIFACT_PATTERNS))
+
+    return artifacts
+
+
+def verify_artifacts(artifact_paths: list[str], rules: list[Rule], jobs: Optional[int] = None) -> dict[str, list[str]]:
+    """Verifies the artifacts in parallel, returns the failures of each artifact in the given order.
+
+    Decompression and zip reading release the GIL, so the threads of a single process can use all CPU cores.
+    """
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        failures = pool.map(lambda path: verify_artifact(path, rules), artifact_paths)
+        return dict(zip(artifact_paths, failures))
+
+
+def verify_artifact(artifact_path: str, rules: list[Rule]) -> list[str]:
+    applicable = [rule for rule in rules if rule.applies_to(artifact_path)]
+
+    try:
+        artifact = open_artifact(artifact_path)
+    except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile, EOFError) as error:
+        return [f'cannot be read: {error}']
+
+    return [f'{rule}: {reason}' for rule in applicable if (reason := rule.verify(artifact))]
+
+
+def open_artifact(artifact_path: str) -> Artifact:
+    if artifact_path.endswith('.whl'):
+        return _read_wheel(artifact_path)
+    elif artifact_path.endswith('.deb'):
+        return _read_deb(artifact_path)
+    else:
+        raise ValueError(f'{artifact_path} is neither a .deb package nor a wheel')
+
+
+def _read_deb(deb_file: str) -> Artifact:
+    artifact = Artifact(deb_file)
+
+    with open(deb_file, 'rb') as file:
+        for name, member in iter_deb_members(file, deb_file):
+            if name.startswith('control.tar'):
+                with open_tar_member(member, name) as tar:
+                    for path, content in _read_tar(tar, lambda path: True):
+                        artifact.control_files[basename(path)] = content
+
+                artifact.fields = {name: value.strip() for name, value in
+                                   parse_control(artifact.control_files.get('control', '')).items()}
+            elif name.startswith('data.tar'):
+                with open_tar_member(member, name) as tar:
+                    for path, content in _read_tar(tar, UNIT_PATTERN.search, artifact.files):
+                        artifact.units[basename(path)] = content
+
+    return artifact
+
+
+def _read_tar(tar: tarfile.TarFile, is_read: Callable[[str], object],
+              files: Optional[list[str]] = None) -> list[tuple[str, str]]:
+    # The members are processed while streaming, the content has to be read before moving to the next member
+    contents = []
+
+    for info in tar:
+        path = info.name.lstrip('.').lstrip('/')
+
+        if info.isdir() or not path:
+            continue
+
+        if files is not None:
+            files.append(path)
+
+        if info.isfile() and is_read(path) and (member := tar.extractfile(info)):
+            contents.append((path, member.read().decode(errors='replace')))
+
+    return contents
+
+
+def _read_wheel(wheel_file: str) -> Artifact:
+    artifact = Artifact(wheel_file)
+
+    with zipfile.ZipFile(wheel_file) as wheel:
+        for info in wheel.infolist():
+            if info.is_dir():
+                continue
+
+            artifact.files.append(info.filename)
+            directory = info.filename.split('/')[0]
+
+            if directory.endswith('.dist-info') and info.filename.count('/') == 1:
+                artifact.control_files[basename(info.filename)] = wheel.read(info).decode(errors='replace')
+            elif UNIT_PATTERN.search(info.filename):
+                artifact.units[basename(info.filename)] = wheel.read(info).decode(errors='replace')
+
+    headers = HeaderParser().parsestr(artifact.control_files.get('METADATA', ''))
+    artifact.fields = {name: ', '.join(headers.get_all(name, [])) for name in dict.fromkeys(headers.keys())}
+
+    return artifact
@@ -0,0 +1,229 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import shutil
+import struct
+import sys
+import time
+from functools import lru_cache
+from os.path import basename, exists, isdir, join, normpath, relpath
+from typing import Optional
+
+from pack_common import METADATA_FILES, is_ignored_directory
+
+# Editor swap and backup files and bytecode, which are not inputs of the packages
+IGNORED_FILES = ['*.swp', '*.swx', '*~', '.#*', '*.pyc']
+BUILD_OUTPUTS = ['build', '*.egg-info']
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+POLL_INTERVAL = 1.0
+
+
+class WorkspaceWatcher:
+    """Waits for changes of the files in the workspace directories, except the build outputs.
+
+    Uses inotify if available, otherwise polls the modification times of the files.
+    """
+
+    def __init__(self, workspaces: list[str], debounce: float = 0.5) -> None:
+        self.workspaces = workspaces
+        self.debounce = debounce
+        self._fd = _init_inotify()
+        self._watches: dict[int, str] = {}
+        self._snapshot: dict[str, tuple[int, int]] = {}
+
+        if self._fd is not None:
+            for workspace_dir in workspaces:
+                self._add_watches(workspace_dir)
+        else:
+            print('inotify is not available, polling the workspaces for changes', file=sys.stderr)
+            self._snapshot = self._take_snapshot()
+
+    def wait(self) -> set[str]:
+        """Returns the paths changed since the last call, after no more changes are seen for the debounce time."""
+        # Events of ignored files and directories are read without any changes
+        while not (changes := self._read_changes(None)):
+            pass
+
+        while more := self._read_changes(self.debounce):
+            changes |= more
+
+        return changes
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+
+    def _read_changes(self, timeout: Optional[float]) -> set[str]:
+        if self._fd is None:
+            return self._poll_changes(timeout)
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+
+        if not readable:
+            return set()
+
+        return self._read_events()
+
+    def _read_events(self) -> set[str]:
+        changes = set()
+        data = os.read(self._fd, 64 * 1024) if self._fd is not None else b''
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0').decode()
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            if not (directory := self._watches.get(wd)) or not name:
+                continue
+
+            path = join(directory, name)
+
+            if mask & IN_ISDIR:
+                if is_ignored_directory(name):
+                    continue
+
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files created before the watch is added are reported as changes as well
+                    changes |= self._add_watches(path)
+            elif _is_ignored_file(name):
+                continue
+
+            changes.add(path)
+
+        return changes
+
+    def _add_watches(self, directory: str) -> set[str]:
+        paths: set[str] = set()
+
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [name for name in dirs if not is_ignored_directory(name)]
+
+            if self._fd is not None:
+                wd = _libc().inotify_add_watch(self._fd, root.encode(), WATCH_MASK)
+
+                if wd >= 0:
+                    self._watches[wd] = root
+
+            paths.update(join(root, name) for name in files if not _is_ignored_file(name))
+
+        return paths
+
+    def _poll_changes(self, timeout: Optional[float]) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            snapshot = self._take_snapshot()
+            changes = {path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+            time.sleep(POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+    def _take_snapshot(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+
+        for workspace_dir in self.workspaces:
+            for root, dirs, files in os.walk(workspace_dir):
+                dirs[:] = [name for name in dirs if not is_ignored_directory(name)]
+
+                for name in files:
+                    if not _is_ignored_file(name) and exists(path := join(root, name)):
+                        stat = os.stat(path)
+                        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+
+def update_copy(workspace_dir: str, copy_dir: str) -> bool:
+    """Updates the copy of the workspace with the changed files, keeping its build outputs.
+
+    Returns False if the build outputs cannot be reused, as files were removed or the project metadata changed.
+    """
+    reusable = True
+    copied = set()
+
+    for root, dirs, files in os.walk(workspace_dir):
+        dirs[:] = [name for name in dirs if not is_ignored_directory(name)]
+        target_root = normpath(join(copy_dir, relpath(root, workspace_dir)))
+
+        os.makedirs(target_root, exist_ok=True)
+
+        for name in files:
+            source, target = join(root, name), join(target_root, name)
+            copied.add(target)
+
+            if not _is_same_file(source, target):
+                shutil.copy2(source, target, follow_symlinks=False)
+                reusable = reusable and not (root == workspace_dir and name in METADATA_FILES)
+
+    for root, dirs, files in os.walk(copy_dir, topdown=True):
+        dirs[:] = [name for name in dirs if not is_ignored_directory(name)]
+
+        for name in files:
+            if (path := join(root, name)) not in copied:
+                os.remove(path)
+                reusable = False
+
+    return reusable
+
+
+def remove_build_outputs(directory: str) -> None:
+    for name in os.listdir(directory):
+        if isdir(path := join(directory, name)) and any(fnmatch.fnmatch(name, output) for output in BUILD_OUTPUTS):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _is_same_file(source: str, target: str) -> bool:
+    try:
+        source_stat, target_stat = os.lstat(source), os.lstat(target)
+    except OSError:
+        return False
+
+    return (source_stat.st_mtime_ns, source_stat.st_size) == (target_stat.st_mtime_ns, target_stat.st_size)
+
+
+def _is_ignored_file(name: str) -> bool:
+    return any(fnmatch.fnmatch(basename(name), pattern) for pattern in IGNORED_FILES)
+
+
+@lru_cache(maxsize=None)
+def _libc() -> ctypes.CDLL:
+    return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def _init_inotify() -> Optional[int]:
+    try:
+        fd: int = _libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    return fd if fd >= 0 else None
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    run_command,
+)
+
+
+class AptRepoTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(
+            f"{TEST_RESOURCE_ROOT}/test-project", TEST_PROJECT_ROOT, dirs_exist_ok=True
+        )
+        print()
+
+    def test_apt_repo_indexes_packages(self):
+        # Given
+        repo_dir = f"{TEST_PROJECT_ROOT}/dist"
+        deb_file = run_command(
+            [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native"]
+        ).stdout.strip()
+        command = [f"{RESOURCE_ROOT}/pack_apt-repo", repo_dir, "--origin", "test"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{repo_dir}/Packages\n{repo_dir}/Packages.gz\n{repo_dir}/Release\n",
+            result.stdout,
+        )
+        with open(f"{repo_dir}/Packages", "r") as file:
+            packages = file.read()
+        with open(deb_file, "rb") as file:
+            sha256 = hashlib.sha256(file.read()).hexdigest()
+        self.assertTrue(packages.startswith("Package: python3-test-project\n"))
+        self.assertIn("Filename: ./python3-test-project_1.0.0_all.deb\n", packages)
+        self.assertIn(f"SHA256: {sha256}\n", packages)
+        with open(f"{repo_dir}/Release", "r") as file:
+            self.assertTrue(file.read().startswith("Origin: test\n"))
+
+    def test_apt_repo_when_index_is_up_to_date(self):
+        # Given
+        repo_dir = f"{TEST_PROJECT_ROOT}/dist"
+        run_command([f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native"])
+        command = [f"{RESOURCE_ROOT}/pack_apt-repo", repo_dir]
+        run_command(command)
+        modified = os.path.getmtime(f"{repo_dir}/Packages")
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertIn("is up to date", result.stderr)
+        self.assertEqual(modified, os.path.getmtime(f"{repo_dir}/Packages"))
+
+    def test_apt_repo_when_updated_concurrently(self):
+        # Given
+        repo_dir = f"{TEST_PROJECT_ROOT}/dist"
+        run_command([f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native"])
+        command = [f"{RESOURCE_ROOT}/pack_apt-repo", repo_dir]
+
+        # When
+        processes = [subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for _ in range(4)]
+
+        # Then
+        self.assertEqual([0, 0, 0, 0], [process.wait() for process in processes])
+        self.assertEqual([], [name for name in os.listdir(repo_dir) if name.endswith(".tmp")])
+        self.assertEqual(0o644, os.stat(f"{repo_dir}/Packages").st_mode & 0o777)
+        with open(f"{repo_dir}/Packages", "r") as file:
+            self.assertTrue(file.read().startswith("Package: python3-test-project\n"))
+
+    def test_apt_repo_when_repository_directory_does_not_exist(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_apt-repo", f"{TEST_FILE_SYSTEM_ROOT}/missing"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+
+
+if __name__ == "__main__":
+    unittest.main()
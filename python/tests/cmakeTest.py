@@ -0,0 +1,74 @@
+import json
+import shutil
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    run_command,
+)
+
+TEST_CMAKE_PROJECT_ROOT = f'{TEST_FILE_SYSTEM_ROOT}/etc/test-cmake-project'
+
+
+class CmakeTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-cmake-project', TEST_CMAKE_PROJECT_ROOT, dirs_exist_ok=True)
+        print()
+
+    def configure(self):
+        run_command(['cmake', '-S', TEST_CMAKE_PROJECT_ROOT, '-B', f'{TEST_CMAKE_PROJECT_ROOT}/build'])
+
+    def test_pack_cmake_when_generators_configured(self):
+        # Given
+        self.configure()
+        command = [f'{RESOURCE_ROOT}/pack_cmake', TEST_CMAKE_PROJECT_ROOT, '-j', '2', '-r',
+                   f'{TEST_FILE_SYSTEM_ROOT}/report.json']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_CMAKE_PROJECT_ROOT}/build/test-cmake-project-1.0.0-Linux.deb\n'
+                         f'{TEST_CMAKE_PROJECT_ROOT}/build/test-cmake-project-1.0.0-Linux.tar.gz\n', result.stdout)
+        with open(f'{TEST_FILE_SYSTEM_ROOT}/report.json') as file:
+            report = json.load(file)
+        self.assertEqual(['build', 'cpack DEB', 'cpack TGZ'], [phase['name'] for phase in report['phases']])
+        self.assertEqual([f'{TEST_CMAKE_PROJECT_ROOT}/build/test-cmake-project-1.0.0-Linux.deb'],
+                         report['phases'][1]['artifacts'])
+
+    def test_pack_cmake_when_components_specified(self):
+        # Given
+        self.configure()
+        command = [f'{RESOURCE_ROOT}/pack_cmake', TEST_CMAKE_PROJECT_ROOT, '-G', 'DEB', '-C', 'all', '-j', '2',
+                   '-o', f'{TEST_FILE_SYSTEM_ROOT}/dist']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_FILE_SYSTEM_ROOT}/dist/test-cmake-project-1.0.0-Linux-config.deb\n'
+                         f'{TEST_FILE_SYSTEM_ROOT}/dist/test-cmake-project-1.0.0-Linux-doc.deb\n', result.stdout)
+
+    def test_pack_cmake_when_build_directory_is_not_configured(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_cmake', TEST_CMAKE_PROJECT_ROOT]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertEqual('', result.stdout)
+        self.assertIn(f'No configured build directory found in {TEST_CMAKE_PROJECT_ROOT}', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import filecmp
+import lzma
+import os
+import shutil
+import sys
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+    run_command,
+)
+
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_delta import create_delta  # noqa: E402
+
+DELTA_DIR = f'{TEST_FILE_SYSTEM_ROOT}/delta'
+OUTPUT_DIR = f'{TEST_FILE_SYSTEM_ROOT}/output'
+DELTA_NAME = 'python3-test-project_1.0.0_1.0.1_all.debdelta'
+
+
+class DeltaTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-project', TEST_PROJECT_ROOT, dirs_exist_ok=True)
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/table.py',
+                    ''.join(f'VALUE_{i} = {i * 7919 % 100003}\n' for i in range(10000)))
+        print()
+
+    def build_packages(self, *arguments):
+        command = [f'{RESOURCE_ROOT}/pack_fpm-deb', TEST_PROJECT_ROOT, '-b', 'native', *arguments]
+        old_deb = run_command([*command, '-o', f'{TEST_FILE_SYSTEM_ROOT}/old']).stdout.strip()
+
+        with open(f'{TEST_PROJECT_ROOT}/setup.py') as file:
+            setup = file.read().replace("version='1.0.0'", "version='1.0.1'")
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', setup)
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/newFile.py', 'VALUE = 1\n')
+        with open(f'{TEST_PROJECT_ROOT}/test_module/table.py', 'a') as file:
+            file.write('VALUE_10000 = 1\n')
+
+        new_deb = run_command([*command, '-o', f'{TEST_FILE_SYSTEM_ROOT}/new']).stdout.strip()
+        return old_deb, new_deb
+
+    def create_and_apply(self, old_deb, new_deb):
+        run_command([f'{RESOURCE_ROOT}/pack_deb-delta', 'create', old_deb, new_deb, '-o', DELTA_DIR])
+        return run_command([f'{RESOURCE_ROOT}/pack_deb-delta', 'apply', old_deb, f'{DELTA_DIR}/{DELTA_NAME}',
+                            '-o', OUTPUT_DIR])
+
+    def test_delta_reconstructs_identical_package(self):
+        # Given
+        old_deb, new_deb = self.build_packages()
+
+        # When
+        result = self.create_and_apply(old_deb, new_deb)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{OUTPUT_DIR}/python3-test-project_1.0.1_all.deb\n', result.stdout)
+        self.assertTrue(filecmp.cmp(new_deb, result.stdout.strip(), shallow=False))
+        self.assertLess(os.path.getsize(f'{DELTA_DIR}/{DELTA_NAME}'), os.path.getsize(new_deb) / 10)
+
+    def test_delta_reconstructs_identical_package_when_compressed_with_zstd(self):
+        # Given
+        old_deb, new_deb = self.build_packages('-z', 'zstd', '--compression-level', '5')
+
+        # When
+        result = self.create_and_apply(old_deb, new_deb)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertTrue(filecmp.cmp(new_deb, result.stdout.strip(), shallow=False))
+        self.assertLess(os.path.getsize(f'{DELTA_DIR}/{DELTA_NAME}'), os.path.getsize(new_deb) / 10)
+
+    def test_delta_patches_compressed_member_when_compression_not_reproducible(self):
+        # Given
+        old_deb, new_deb = self.build_packages('-z', 'xz')
+        recompress_data(new_deb)
+        os.makedirs(DELTA_DIR)
+
+        # When
+        manifest = create_delta(old_deb, new_deb, f'{DELTA_DIR}/{DELTA_NAME}')
+        result = run_command([f'{RESOURCE_ROOT}/pack_deb-delta', 'apply', old_deb, f'{DELTA_DIR}/{DELTA_NAME}',
+                              '-o', OUTPUT_DIR])
+
+        # Then
+        self.assertEqual(['copy', 'tar', 'patch'], [member['method'] for member in manifest['members']])
+        self.assertEqual(0, result.returncode)
+        self.assertTrue(filecmp.cmp(new_deb, result.stdout.strip(), shallow=False))
+
+    def test_apply_fails_when_delta_created_from_other_package(self):
+        # Given
+        old_deb, new_deb = self.build_packages()
+        run_command([f'{RESOURCE_ROOT}/pack_deb-delta', 'create', old_deb, new_deb, '-o', DELTA_DIR])
+
+        # When
+        result = run_command([f'{RESOURCE_ROOT}/pack_deb-delta', 'apply', new_deb, f'{DELTA_DIR}/{DELTA_NAME}',
+                              '-o', OUTPUT_DIR])
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertIn(f'{DELTA_NAME} was not created from {new_deb}', result.stderr)
+        self.assertEqual([], os.listdir(OUTPUT_DIR))
+
+
+def recompress_data(deb_file):
+    # Compressed with a setting not reproduced by the delta, the size in the ar header is fixed up
+    with open(deb_file, 'rb') as file:
+        content = file.read()
+
+    position = content.index(b'data.tar.xz')
+    size = int(content[position + 48:position + 58])
+    data = lzma.compress(lzma.decompress(content[position + 60:position + 60 + size]),
+                         preset=9 | lzma.PRESET_EXTREME)
+    header = content[position:position + 48] + str(len(data)).ljust(10).encode() + content[position + 58:position + 60]
+
+    with open(deb_file, 'wb') as file:
+        file.write(content[:position] + header + data + (b'\n' if len(data) % 2 else b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import json
 import os
 import shutil
+import subprocess
+import sys
 import unittest
 from unittest import TestCase
 
@@ -136,6 +139,91 @@ class DhVirtualenvTest(TestCase):
             )
         )
 
+    def test_dh_virtualenv_when_wheelhouse_specified(self):
+        # Given
+        wheelhouse = f"{TEST_FILE_SYSTEM_ROOT}/wheelhouse"
+        run_command(
+            [f"{RESOURCE_ROOT}/pack_wheelhouse", "-w", wheelhouse, "warm", TEST_PROJECT_ROOT]
+        )
+        command = [
+            f"{RESOURCE_ROOT}/pack_dh-virtualenv",
+            TEST_PROJECT_ROOT,
+            "-w",
+            wheelhouse,
+            "--no-index",
+        ]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/test-project_1.0.0-1_all.deb\n", result.stdout
+        )
+        self.assertTrue(check_files_exist(result.stdout))
+
+    def test_dh_virtualenv_when_precompile_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_dh-virtualenv", TEST_PROJECT_ROOT, "--precompile"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        files = subprocess.run(
+            ["dpkg-deb", "-c", result.stdout.strip()], text=True, stdout=subprocess.PIPE
+        ).stdout
+        self.assertIn(
+            f"/opt/venvs/test-project/lib/python3.{sys.version_info.minor}/site-packages/test_module/__pycache__/"
+            f"testFile.{sys.implementation.cache_tag}.pyc",
+            files,
+        )
+
+    def test_dh_virtualenv_when_slim_specified(self):
+        # Given
+        command = [
+            f"{RESOURCE_ROOT}/pack_dh-virtualenv",
+            TEST_PROJECT_ROOT,
+            "--slim",
+            "--slim-rule=-bytecode",
+            "-r",
+            f"{TEST_FILE_SYSTEM_ROOT}/report.json",
+        ]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        files = subprocess.run(
+            ["dpkg-deb", "-c", result.stdout.strip()], text=True, stdout=subprocess.PIPE
+        ).stdout
+        self.assertNotIn("/opt/venvs/test-project/bin/pip", files)
+        self.assertNotIn("/site-packages/pip/", files)
+        self.assertIn("/site-packages/test_module/__pycache__/", files)
+        with open(f"{TEST_FILE_SYSTEM_ROOT}/report.json") as file:
+            slim_report = json.load(file)["children"][0]
+        self.assertEqual("slim", slim_report["name"])
+        self.assertGreater(
+            next(phase["saved_bytes"] for phase in slim_report["phases"] if phase["name"] == "build-tools"), 0
+        )
+
+    def test_dh_virtualenv_when_precompile_and_slim_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_dh-virtualenv", TEST_PROJECT_ROOT, "--precompile", "--slim"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        with open(f"{TEST_PROJECT_ROOT}/dist/test-project-1.0.0/debian/rules") as file:
+            rules = file.read()
+        self.assertEqual(1, rules.count("override_dh_virtualenv:"))
+        self.assertLess(rules.index("pack_slim"), rules.index("compileall"))
+
     def test_propagates_return_code_of_command(self):
         # Given
         command = [
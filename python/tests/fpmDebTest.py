@@ -1,7 +1,15 @@
+import hashlib
+import io
+import json
+import marshal
 import os
 import shutil
+import subprocess
+import sys
+import tarfile
+import time
 import unittest
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from utils import (
     TEST_PROJECT_ROOT,
@@ -132,6 +140,199 @@ class FpmDebTest(TestCase):
             )
         )
 
+    def test_fpm_deb_when_native_backend_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n",
+            result.stdout,
+        )
+        self.assertTrue(check_files_exist(result.stdout))
+        self.assertTrue(
+            check_file_is_in_deb(
+                f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb",
+                "usr/lib/python3/dist-packages/test_module/testFile.py",
+            )
+        )
+
+    def test_fpm_deb_when_native_backend_and_wheel_specified(self):
+        # Given
+        wheel_file = run_command([f"{RESOURCE_ROOT}/pack_wheel", TEST_PROJECT_ROOT]).stdout.strip()
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "--wheel", wheel_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n",
+            result.stdout,
+        )
+        self.assertNotIn("bdist_wheel", result.stderr)
+        self.assertTrue(
+            check_file_is_in_deb(
+                f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb",
+                "usr/lib/python3/dist-packages/test_module/testFile.py",
+            )
+        )
+
+    def test_fpm_deb_when_native_backend_and_compression_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "-z", "xz",
+                   "--compression-level", "1", "--compression-threads", "2"]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        members = subprocess.run(["ar", "t", result.stdout.strip()], text=True, stdout=subprocess.PIPE).stdout
+        self.assertEqual(["debian-binary", "control.tar.gz", "data.tar.xz"], members.split())
+        self.assertTrue(
+            check_file_is_in_deb(
+                f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb",
+                "usr/lib/python3/dist-packages/test_module/testFile.py",
+            )
+        )
+
+    def test_fpm_deb_when_native_backend_and_compressor_not_installed(self):
+        # Given
+        wheel_file = run_command([f"{RESOURCE_ROOT}/pack_wheel", TEST_PROJECT_ROOT]).stdout.strip()
+        bin_dir = f"{TEST_FILE_SYSTEM_ROOT}/bin"
+        os.makedirs(bin_dir)
+        os.symlink(sys.executable, f"{bin_dir}/python3")
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "-z", "zstd", "--wheel",
+                   wheel_file]
+
+        # When
+        with mock.patch.dict(os.environ, {"PATH": bin_dir}):
+            result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertEqual("", result.stdout)
+        self.assertIn("zstd is not installed", result.stderr)
+
+    def test_fpm_deb_when_native_backend_and_precompile_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "--precompile"]
+        pyc_file = "usr/lib/python3/dist-packages/test_module/__pycache__/testFile.{}.pyc".format(
+            sys.implementation.cache_tag
+        )
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        content = subprocess.run(
+            ["dpkg-deb", "--fsys-tarfile", result.stdout.strip()], stdout=subprocess.PIPE
+        ).stdout
+        with tarfile.open(fileobj=io.BytesIO(content)) as tar:
+            pyc = tar.extractfile(f"./{pyc_file}").read()
+        # Unchecked hash based .pyc, compiled with the installed path of the module
+        self.assertEqual(1, int.from_bytes(pyc[4:8], "little"))
+        self.assertEqual(
+            "/usr/lib/python3/dist-packages/test_module/testFile.py",
+            marshal.loads(pyc[16:]).co_filename,
+        )
+
+    def test_fpm_deb_when_native_backend_and_import_times_specified(self):
+        # Given
+        report_file = f"{TEST_FILE_SYSTEM_ROOT}/report.json"
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "--import-times",
+                   "-r", report_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertIn("Import time of test_module", result.stderr)
+        with open(report_file, "r") as file:
+            import_times = json.load(file)["import_times"]
+        self.assertEqual(["test_module"], [time["module"] for time in import_times["test_module"]])
+
+    def test_fpm_deb_when_native_backend_and_reproducible_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_fpm-deb", TEST_PROJECT_ROOT, "-b", "native", "--reproducible"]
+        deb_file = run_command(command).stdout.strip()
+        with open(deb_file, "rb") as file:
+            first_hash = hashlib.sha256(file.read()).hexdigest()
+        delete_directory(f"{TEST_PROJECT_ROOT}/dist")
+        delete_directory(f"{TEST_PROJECT_ROOT}/build")
+        time.sleep(1)
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        with open(deb_file, "rb") as file:
+            self.assertEqual(first_hash, hashlib.sha256(file.read()).hexdigest())
+
+    def test_fpm_deb_when_native_backend_and_service_and_extra_files_specified(self):
+        # Given
+        command = [
+            f"{RESOURCE_ROOT}/pack_fpm-deb",
+            TEST_PROJECT_ROOT,
+            "-b",
+            "native",
+            "-a",
+            "--deb-systemd service/test-project.service --after-install scripts/test-project.postinst",
+        ]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n",
+            result.stdout,
+        )
+        self.assertTrue(
+            check_file_is_in_deb(
+                f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb",
+                "lib/systemd/system/test-project.service",
+            )
+        )
+        self.assertTrue(
+            check_files_matches_in_deb(
+                f"{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb",
+                [
+                    ("postinst", "test-project successfully installed"),
+                    ("postinst", "systemctl --system daemon-reload"),
+                    ("control", "Package: python3-test-project"),
+                ],
+            )
+        )
+
+    def test_fpm_deb_when_native_backend_and_unsupported_argument_specified(self):
+        # Given
+        command = [
+            f"{RESOURCE_ROOT}/pack_fpm-deb",
+            TEST_PROJECT_ROOT,
+            "-b",
+            "native",
+            "-a",
+            "--rpm-os linux",
+        ]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(2, result.returncode)
+        self.assertEqual("", result.stdout)
+
     def test_propagates_return_code_of_command(self):
         # Given
         command = [
@@ -0,0 +1,153 @@
+import json
+import os
+import sys
+import unittest
+from unittest import TestCase, mock
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+)
+
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_common import get_metadata, ProjectMetadata, METADATA_ENVIRONMENT  # noqa: E402
+
+
+class MetadataTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        print()
+
+    def test_metadata_when_setup_py_uses_constants(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', '''from setuptools import setup
+
+NAME = "test-project"
+DEPENDENCIES = ["requests>=2"]
+
+print(dict(name="not-the-name"))
+
+setup(
+    name=NAME,
+    version="1.2.3",
+    install_requires=DEPENDENCIES,
+    entry_points={"console_scripts": ["test-project=test_module.main:main"]},
+)
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual(ProjectMetadata('test-project', '1.2.3', ['requests>=2'],
+                                         {'console_scripts': ['test-project=test_module.main:main']}), metadata)
+
+    def test_metadata_when_setup_cfg_specified(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', 'from setuptools import setup\n\nsetup()\n')
+        create_file(f'{TEST_PROJECT_ROOT}/setup.cfg', '''[metadata]
+name = test-project
+version = 1.2.3
+
+[options]
+install_requires =
+    requests>=2
+    six
+
+[options.entry_points]
+console_scripts =
+    test-project = test_module.main:main
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual(ProjectMetadata('test-project', '1.2.3', ['requests>=2', 'six'],
+                                         {'console_scripts': ['test-project = test_module.main:main']}), metadata)
+
+    def test_metadata_when_pyproject_toml_specified(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', 'from setuptools import setup\n\nsetup(name="other")\n')
+        create_file(f'{TEST_PROJECT_ROOT}/pyproject.toml', '''[project]
+name = "test-project"
+version = "1.2.3"
+dependencies = ["requests>=2"]
+
+[project.scripts]
+test-project = "test_module.main:main"
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual(ProjectMetadata('test-project', '1.2.3', ['requests>=2'],
+                                         {'console_scripts': ['test-project = test_module.main:main']}), metadata)
+
+    def test_metadata_when_version_is_computed(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/VERSION', '1.2.3\n')
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', '''from setuptools import setup
+
+setup(name="test-project", version=open("VERSION").read().strip())
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual('test-project', metadata.name)
+        self.assertEqual('1.2.3', metadata.version)
+
+    def test_metadata_when_setup_py_cannot_be_parsed(self):
+        # Given
+        python_bin = f'{TEST_FILE_SYSTEM_ROOT}/bin/python3'
+        create_file(python_bin, '#!/bin/sh\necho test-project\necho 1.2.3\n')
+        os.chmod(python_bin, 0o755)
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', '''from setuptools import setup
+
+setup(name="test-project", version="1.2.3", python_requires=>"3.9")
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT, python_bin)
+
+        # Then
+        self.assertEqual('test-project', metadata.name)
+        self.assertEqual('1.2.3', metadata.version)
+
+    def test_metadata_when_setup_py_has_invalid_literal(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', '''from setuptools import setup
+
+setup(name="test-project", version="1.2.3", entry_points={["console_scripts"]: []})
+''')
+
+        # When
+        metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual('test-project', metadata.name)
+        self.assertEqual({}, metadata.entry_points)
+
+    def test_metadata_when_passed_in_environment(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/setup.py', 'raise SystemExit(3)\n')
+        environment = {METADATA_ENVIRONMENT: json.dumps({'name': 'test-project', 'version': '1.2.3'})}
+
+        # When
+        with mock.patch.dict(os.environ, environment):
+            metadata = get_metadata(TEST_PROJECT_ROOT)
+
+        # Then
+        self.assertEqual(ProjectMetadata('test-project', '1.2.3'), metadata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,22 @@
+import io
+import json
 import os
 import shutil
+import subprocess
+import sys
 import unittest
+from argparse import Namespace
+from contextlib import redirect_stderr, redirect_stdout
 from unittest import TestCase
 
 from utils import TEST_PROJECT_ROOT, RESOURCE_ROOT, TEST_RESOURCE_ROOT, delete_directory, TEST_FILE_SYSTEM_ROOT, \
     run_command, create_file, check_files_exist
 
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_common import load_script  # noqa: E402
+from pack_report import Report  # noqa: E402
+
 
 class PackPythonTest(TestCase):
 
@@ -16,7 +27,7 @@ class PackPythonTest(TestCase):
 
     def test_pack_python_when_packaging_default(self):
         # Given
-        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT]
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--no-cache']
 
         # When
         result = run_command(command)
@@ -32,7 +43,8 @@ class PackPythonTest(TestCase):
                     '[pack-python]\n'
                     'default = dh-virtualenv\n')
 
-        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-c', f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg']
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--no-cache', '-c',
+                   f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg']
 
         # When
         result = run_command(command)
@@ -44,7 +56,7 @@ class PackPythonTest(TestCase):
 
     def test_pack_python_when_packaging_specified(self):
         # Given
-        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel fpm-deb']
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel fpm-deb', '--no-cache']
 
         # When
         result = run_command(command)
@@ -57,7 +69,7 @@ class PackPythonTest(TestCase):
 
     def test_pack_python_when_packaging_all_and_no_output_dir_specified(self):
         # Given
-        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--all']
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--all', '--no-cache']
 
         # When
         result = run_command(command)
@@ -72,7 +84,7 @@ class PackPythonTest(TestCase):
     def test_pack_python_when_packaging_all_and_relative_output_dir_specified(self):
         # Given
         output_dir = 'tests/test_root/etc/dist' if os.path.exists('tests') else 'test_root/etc/dist'
-        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-o', output_dir, '--all']
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-o', output_dir, '--all', '--no-cache']
 
         # When
         result = run_command(command)
@@ -87,7 +99,7 @@ class PackPythonTest(TestCase):
     def test_pack_python_when_packaging_all_and_absolute_output_dir_specified(self):
         # Given
         command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-o', f'{TEST_FILE_SYSTEM_ROOT}/etc/dist',
-                   '--all']
+                   '--all', '--no-cache']
 
         # When
         result = run_command(command)
@@ -99,10 +111,252 @@ class PackPythonTest(TestCase):
                          f'{TEST_FILE_SYSTEM_ROOT}/etc/dist/test-project_1.0.0-1_all.deb\n', result.stdout)
         self.assertTrue(check_files_exist(result.stdout))
 
+    def test_pack_python_when_packaging_all_in_parallel(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--all', '--no-cache', '-j', '3']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n'
+                         f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n'
+                         f'{TEST_PROJECT_ROOT}/dist/test-project_1.0.0-1_all.deb\n', result.stdout)
+        self.assertTrue(check_files_exist(result.stdout))
+        self.assertFalse(os.path.exists(f'{TEST_PROJECT_ROOT}/build'))
+
+    def test_pack_python_restores_packages_from_cache_when_workspace_unchanged(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel', '--cache-dir',
+                   f'{TEST_FILE_SYSTEM_ROOT}/cache']
+        run_command(command)
+        delete_directory(f'{TEST_PROJECT_ROOT}/dist')
+        delete_directory(f'{TEST_PROJECT_ROOT}/build')
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertTrue(check_files_exist(result.stdout))
+        self.assertIn('from cache', result.stderr)
+        self.assertFalse(os.path.exists(f'{TEST_PROJECT_ROOT}/build'))
+
+    def test_pack_python_when_cache_disabled(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel', '--cache-dir',
+                   f'{TEST_FILE_SYSTEM_ROOT}/cache']
+        run_command(command)
+
+        # When
+        result = run_command([*command, '--no-cache'])
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertNotIn('from cache', result.stderr)
+
+    def test_pack_python_when_report_specified(self):
+        # Given
+        report_file = f'{TEST_FILE_SYSTEM_ROOT}/report.json'
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache', '-r', report_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        with open(report_file) as file:
+            report = json.load(file)
+        self.assertEqual(['wheel'], [phase['name'] for phase in report['phases']])
+        self.assertEqual(['wheel'], [child['name'] for child in report['children']])
+        self.assertEqual([f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl'],
+                         [artifact['path'] for artifact in report['artifacts']])
+
+    def test_pack_python_builds_wheel_once_for_all_packaging_scripts(self):
+        # Given
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg',
+                    '[pack-python]\n'
+                    'packaging = wheel fpm-deb\n'
+                    'fpm-deb = -b native -a "--deb-systemd service/test-project.service"\n')
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--all', '--no-cache', '--shared-wheel', '-j',
+                   '2', '-c', f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n'
+                         f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n', result.stdout)
+        self.assertEqual(1, result.stderr.count('setup.py bdist_wheel'))
+
+    def test_pack_python_when_compression_configured(self):
+        # Given
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg',
+                    '[pack-python]\n'
+                    'default = fpm-deb\n'
+                    'compression = zstd\n'
+                    'fpm-deb = -b native\n')
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--no-cache', '--compression-level', '3', '-c',
+                   f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n', result.stdout)
+        members = subprocess.run(['ar', 't', result.stdout.strip()], text=True, stdout=subprocess.PIPE).stdout
+        self.assertIn('data.tar.zst', members)
+
+    def test_pack_python_when_multiple_python_bins_specified(self):
+        # Given
+        python_wrapper = f'{TEST_FILE_SYSTEM_ROOT}/tmp/python-wrapper'
+        create_file(python_wrapper, '#!/bin/sh\nexec python3 "$@"\n')
+        os.chmod(python_wrapper, 0o755)
+        interpreter = subprocess.run(['python3', '-c', 'import sys; print("cp%d%d" % sys.version_info[:2])'],
+                                     text=True, stdout=subprocess.PIPE).stdout.strip()
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache', '-p',
+                   f'python3 {python_wrapper}']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/{interpreter}/test_project-1.0.0-py3-none-any.whl\n' * 2,
+                         result.stdout)
+        self.assertFalse(os.path.exists(f'{TEST_PROJECT_ROOT}/build'))
+
+    def test_pack_python_when_multiple_workspaces_specified(self):
+        # Given
+        other_project_root = f'{TEST_FILE_SYSTEM_ROOT}/etc/other-project'
+        shutil.copytree(TEST_PROJECT_ROOT, other_project_root)
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/etc/manifest.txt', '# Projects\nother-project\n')
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-m', f'{TEST_FILE_SYSTEM_ROOT}/etc/manifest.txt',
+                   '-s', 'wheel', '--no-cache', '-j', '2']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n'
+                         f'{other_project_root}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertIn('Workspace', result.stderr)
+
+    def test_pack_python_when_jobs_scheduled_by_footprint(self):
+        # Given
+        other_project_root = f'{TEST_FILE_SYSTEM_ROOT}/etc/other-project'
+        shutil.copytree(TEST_PROJECT_ROOT, other_project_root)
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, other_project_root, '-s', 'wheel', '--no-cache',
+                   '-j', 'auto', '--cpu-budget', '4', '--scheduler-dir', f'{TEST_FILE_SYSTEM_ROOT}/scheduler',
+                   '-r', f'{TEST_FILE_SYSTEM_ROOT}/report.json']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n'
+                         f'{other_project_root}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        with open(f'{TEST_FILE_SYSTEM_ROOT}/report.json') as file:
+            phases = json.load(file)['phases']
+        # The parallelism depends on the number of jobs waiting when a job is admitted
+        self.assertTrue(all(1 <= phase['parallel'] <= 4 and 'footprint' in phase for phase in phases))
+        with open(f'{TEST_FILE_SYSTEM_ROOT}/scheduler/footprints.json') as file:
+            footprints = json.load(file)['wheel']
+        self.assertEqual({TEST_PROJECT_ROOT, other_project_root}, set(footprints))
+        self.assertGreater(footprints[TEST_PROJECT_ROOT][0]['peak_rss_kb'], 0)
+
+    def test_pack_python_isolates_failures_of_workspaces(self):
+        # Given
+        failing_project_root = f'{TEST_FILE_SYSTEM_ROOT}/etc/failing-project'
+        create_file(f'{failing_project_root}/setup.py', 'raise SystemExit(3)\n')
+        command = [f'{RESOURCE_ROOT}/pack_python', f'{TEST_FILE_SYSTEM_ROOT}/etc/*', '-s', 'wheel', '--no-cache']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(3, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertIn(f'{failing_project_root}  wheel   failed (3)', result.stderr)
+
+    def test_pack_python_isolates_errors_of_jobs(self):
+        # Given
+        pack_python = load_script(f'{RESOURCE_ROOT}/pack_python')
+        other_project_root = f'{TEST_FILE_SYSTEM_ROOT}/etc/other-project'
+        wheel_file = f'{other_project_root}/dist/test_project-1.0.0-py3-none-any.whl'
+
+        def fail() -> None:
+            raise OSError('No space left on device')
+
+        def succeed() -> tuple[subprocess.CompletedProcess[str], dict[str, object]]:
+            return subprocess.CompletedProcess([], 0, f'{wheel_file}\n'), {'cached': False, 'wall_time': 1.0}
+
+        jobs = [(TEST_PROJECT_ROOT, 'wheel', fail), (TEST_PROJECT_ROOT, 'fpm-deb', succeed),
+                (other_project_root, 'wheel', succeed)]
+        arguments = Namespace(jobs=1)
+
+        # When
+        with redirect_stdout(io.StringIO()) as stdout, redirect_stderr(io.StringIO()) as stderr:
+            returncode = pack_python._run_jobs(arguments, jobs, Report('pack_python'), True)
+
+        # Then
+        self.assertEqual(1, returncode)
+        self.assertEqual(f'{wheel_file}\n', stdout.getvalue())
+        self.assertIn(f"Packaging job wheel in {TEST_PROJECT_ROOT} failed: OSError('No space left on device')",
+                      stderr.getvalue())
+        self.assertIn(f'{TEST_PROJECT_ROOT}   wheel    failed (OSError)', stderr.getvalue())
+        self.assertIn(f'{TEST_PROJECT_ROOT}   fpm-deb  skipped', stderr.getvalue())
+        self.assertIn(f'{other_project_root}  wheel    ok', stderr.getvalue())
+
+    def test_pack_python_when_scripts_run_in_process(self):
+        # Given
+        other_project_root = f'{TEST_FILE_SYSTEM_ROOT}/etc/other-project'
+        shutil.copytree(TEST_PROJECT_ROOT, other_project_root)
+        report_file = f'{TEST_FILE_SYSTEM_ROOT}/report.json'
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, other_project_root, '-s', 'wheel', '--no-cache',
+                   '--in-process', '-j', '2', '-r', report_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n'
+                         f'{other_project_root}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        with open(report_file) as file:
+            report = json.load(file)
+        # Measured for the whole process, including the other job
+        self.assertEqual([True, True], [phase['approximate'] for phase in report['phases']])
+        self.assertEqual([True, True], [child['approximate'] for child in report['children']])
+
+    def test_pack_python_propagates_exit_code_of_script_run_in_process(self):
+        # Given
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg',
+                    '[pack-python]\n'
+                    'default = fpm-deb\n'
+                    'fpm-deb = -b native -a "--deb-unsupported value"\n')
+        command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '--no-cache', '--in-process', '-c',
+                   f'{TEST_FILE_SYSTEM_ROOT}/tmp/setup.cfg']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(2, result.returncode)
+        self.assertEqual('', result.stdout)
+        self.assertIn('Arguments not supported by the native backend: --deb-unsupported', result.stderr)
+
     def test_propagates_return_code_of_command(self):
         # Given
         command = [f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-o', f'{TEST_FILE_SYSTEM_ROOT}/etc/dist',
-                   '--all', '-p', '/invalid/path']
+                   '--all', '--no-cache', '-p', '/invalid/path']
 
         # When
         result = run_command(command)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import subprocess
+import time
+import unittest
+import zipfile
+from unittest import TestCase, mock
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    run_command,
+)
+
+SOCKET_PATH = f'{TEST_FILE_SYSTEM_ROOT}/pack_python.sock'
+
+
+class PackServerTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-project', TEST_PROJECT_ROOT, dirs_exist_ok=True)
+        environment = mock.patch.dict(os.environ, {'PACK_PYTHON_SOCKET': SOCKET_PATH})
+        environment.start()
+        self.addCleanup(environment.stop)
+        print()
+
+    def start_server(self, cwd=None):
+        server = subprocess.Popen([f'{RESOURCE_ROOT}/pack_python', '--serve', '--workers', '2'], cwd=cwd)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+
+        for _ in range(50):
+            if os.path.exists(SOCKET_PATH):
+                return
+            time.sleep(0.1)
+
+        self.fail('Server did not start')
+
+    def test_pack_client_when_server_is_running(self):
+        # Given
+        self.start_server()
+        command = [f'{RESOURCE_ROOT}/pack_client', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache']
+
+        # When
+        first = run_command(command)
+        second = run_command(command)
+
+        # Then
+        self.assertEqual(0, first.returncode)
+        self.assertEqual(0, second.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', first.stdout)
+        self.assertEqual(first.stdout, second.stdout)
+        self.assertIn('Running packaging script for wheel', first.stderr)
+
+    def test_pack_client_when_relative_store_dir_specified(self):
+        # Given
+        server_dir = f'{TEST_FILE_SYSTEM_ROOT}/server'
+        os.makedirs(server_dir)
+        self.start_server(server_dir)
+        store_dir = 'tests/test_root/store' if os.path.exists('tests') else 'test_root/store'
+        command = [f'{RESOURCE_ROOT}/pack_client', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache', '--reproducible',
+                   '--store', '--store-dir', store_dir]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertTrue(os.path.isdir(f'{os.getcwd()}/{store_dir}'))
+        self.assertFalse(os.path.exists(f'{server_dir}/{store_dir}'))
+
+    def test_pack_client_sends_environment_and_umask_of_client(self):
+        # Given
+        self.start_server()
+        command = [f'{RESOURCE_ROOT}/pack_client', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache']
+        wheel_file = f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl'
+
+        # When
+        with mock.patch.dict(os.environ, {'SOURCE_DATE_EPOCH': '1000000000'}):
+            first = run_command(command)
+        first_year = zipfile.ZipFile(wheel_file).infolist()[0].date_time[0]
+        os.remove(wheel_file)
+        umask = os.umask(0o077)
+        try:
+            with mock.patch.dict(os.environ, {'SOURCE_DATE_EPOCH': '1500000000'}):
+                second = run_command(command)
+        finally:
+            os.umask(umask)
+        second_year = zipfile.ZipFile(wheel_file).infolist()[0].date_time[0]
+
+        # Then
+        self.assertEqual(0, first.returncode)
+        self.assertEqual(0, second.returncode)
+        self.assertEqual(2001, first_year)
+        self.assertEqual(2017, second_year)
+        self.assertEqual(0o600, os.stat(wheel_file).st_mode & 0o777)
+
+    def test_pack_client_propagates_return_code_of_server(self):
+        # Given
+        self.start_server()
+        command = [f'{RESOURCE_ROOT}/pack_client', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache', '-p',
+                   '/invalid/path']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(127, result.returncode)
+        self.assertEqual('', result.stdout)
+        self.assertIn('failed with return code 127', result.stderr)
+
+    def test_pack_client_when_server_is_not_running(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_client', TEST_PROJECT_ROOT, '-s', 'wheel', '--no-cache']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from unittest import TestCase, mock
+
+from utils import (
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+)
+
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_scheduler import JobScheduler  # noqa: E402
+
+SCHEDULER_DIR = f'{TEST_FILE_SYSTEM_ROOT}/scheduler'
+WORKSPACE_DIR = f'{TEST_FILE_SYSTEM_ROOT}/workspace'
+MEMORY_KB = 4 * 1024 * 1024
+
+
+class SchedulerTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        print()
+
+    def test_footprint_learned_from_processes_of_job(self):
+        # Given
+        scheduler = JobScheduler(SCHEDULER_DIR, 4, MEMORY_KB)
+        lease = scheduler.acquire('dh-virtualenv', WORKSPACE_DIR)
+
+        # When
+        subprocess.run([sys.executable, '-c', 'import time; data = bytearray(100 * 1024 * 1024); time.sleep(1.5)'],
+                       env={**os.environ, **lease.get_environment()}, check=True)
+        measured = scheduler.release(lease)
+
+        # Then
+        self.assertGreater(measured.peak_rss_kb, 100 * 1024)
+        self.assertGreater(measured.cpu_cores, 0)
+        self.assertEqual(measured, scheduler.get_footprint('dh-virtualenv', WORKSPACE_DIR))
+        self.assertEqual(measured, scheduler.get_footprint('dh-virtualenv', f'{TEST_FILE_SYSTEM_ROOT}/other'))
+
+    def test_footprint_not_learned_when_requested(self):
+        # Given
+        scheduler = JobScheduler(SCHEDULER_DIR, 4, MEMORY_KB)
+        lease = scheduler.acquire('wheel', WORKSPACE_DIR)
+
+        # When
+        scheduler.release(lease, learn=False)
+
+        # Then
+        self.assertEqual((1.0, 512 * 1024), tuple(vars(scheduler.get_footprint('wheel', WORKSPACE_DIR)).values()))
+
+    def test_job_waits_until_footprint_fits_into_budget(self):
+        # Given
+        create_file(f'{SCHEDULER_DIR}/footprints.json', json.dumps(
+            {'fpm-deb': {WORKSPACE_DIR: [{'cpu_cores': 1.0, 'peak_rss_kb': 3 * 1024 * 1024}]}}))
+        scheduler = JobScheduler(SCHEDULER_DIR, 4, MEMORY_KB)
+        first = scheduler.acquire('fpm-deb', WORKSPACE_DIR)
+        leases = []
+        waiting = threading.Thread(target=lambda: leases.append(scheduler.acquire('fpm-deb', WORKSPACE_DIR)))
+
+        # When
+        waiting.start()
+        waiting.join(1.5)
+        admitted_before_release = bool(leases)
+        scheduler.release(first, learn=False)
+        waiting.join(5)
+
+        # Then
+        self.assertFalse(admitted_before_release)
+        self.assertEqual(1, len(leases))
+        scheduler.release(leases[0], learn=False)
+
+    def test_free_cores_shared_by_waiting_jobs(self):
+        # Given
+        scheduler = JobScheduler(SCHEDULER_DIR, 8, MEMORY_KB)
+
+        # When
+        first = scheduler.acquire('wheel', WORKSPACE_DIR)
+        second = scheduler.acquire('wheel', WORKSPACE_DIR)
+
+        # Then
+        self.assertEqual(8, first.parallel)
+        self.assertEqual(7, second.parallel)
+        scheduler.release(first, learn=False)
+        scheduler.release(second, learn=False)
+
+    def test_leases_of_terminated_processes_ignored(self):
+        # Given
+        process = subprocess.Popen(['true'])
+        process.wait()
+        create_file(f'{SCHEDULER_DIR}/leases.json', json.dumps(
+            {f'{process.pid}-0': {'pid': process.pid, 'name': 'fpm-deb', 'cpus': 4, 'rss_kb': MEMORY_KB}}))
+        scheduler = JobScheduler(SCHEDULER_DIR, 4, MEMORY_KB)
+
+        # When
+        lease = scheduler.acquire('fpm-deb', WORKSPACE_DIR)
+
+        # Then
+        self.assertEqual(4, lease.parallel)
+        scheduler.release(lease, learn=False)
+
+    def test_parallelism_passed_in_environment(self):
+        # Given
+        scheduler = JobScheduler(SCHEDULER_DIR, 3, MEMORY_KB)
+        lease = scheduler.acquire('dh-virtualenv', WORKSPACE_DIR)
+
+        # When
+        with mock.patch.dict(os.environ, {'DEB_BUILD_OPTIONS': 'nocheck parallel=16', 'MAKEFLAGS': '-j16 -s'}):
+            environment = lease.get_environment()
+
+        # Then
+        self.assertEqual('nocheck parallel=3', environment['DEB_BUILD_OPTIONS'])
+        self.assertEqual('-s -j3', environment['MAKEFLAGS'])
+        self.assertEqual(lease.id, environment['PACK_PYTHON_JOB'])
+        scheduler.release(lease, learn=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+    run_command,
+)
+
+VENV_DIR = f'{TEST_FILE_SYSTEM_ROOT}/venv'
+SITE_DIR = f'{VENV_DIR}/lib/python3.11/site-packages'
+REPORT_FILE = f'{TEST_FILE_SYSTEM_ROOT}/slim.json'
+
+RULES = '''[pack-python]
+slim-rules =
+    -docs
+    locales remove */site-packages/*/locale
+'''
+
+
+class SlimTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        create_file(f'{SITE_DIR}/app/__init__.py', 'VALUE = 1\n')
+        create_file(f'{SITE_DIR}/app/__pycache__/__init__.cpython-311.pyc', 'bytecode')
+        create_file(f'{SITE_DIR}/app/tests/test_app.py', 'def test():\n    pass\n')
+        create_file(f'{SITE_DIR}/app/docs/index.rst', 'Documentation\n')
+        create_file(f'{SITE_DIR}/app/locale/de.po', 'msgid ""\n')
+        create_file(f'{SITE_DIR}/app-1.0.0.dist-info/METADATA', 'Name: app\n')
+        create_file(f'{SITE_DIR}/pip/__init__.py', '')
+        create_file(f'{SITE_DIR}/pip-24.0.dist-info/METADATA', 'Name: pip\n')
+        create_file(f'{VENV_DIR}/bin/pip', '#!/bin/sh\n')
+        create_file(f'{VENV_DIR}/bin/app', '#!/bin/sh\n')
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/slim.cfg', RULES)
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/extension.c', 'int value(void) { return 1; }\n')
+        subprocess.run(['gcc', '-g', '-shared', '-fPIC', '-o', f'{SITE_DIR}/app/_native.cpython-311.so',
+                        f'{TEST_FILE_SYSTEM_ROOT}/extension.c'], check=True)
+        print()
+
+    def test_slim_with_default_profile(self):
+        # Given
+        size = os.path.getsize(f'{SITE_DIR}/app/_native.cpython-311.so')
+        command = [f'{RESOURCE_ROOT}/pack_slim', VENV_DIR, '-c', '/dev/null', '-r', REPORT_FILE]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(['app', 'app-1.0.0.dist-info'], sorted(os.listdir(SITE_DIR)))
+        self.assertEqual(['__init__.py', '_native.cpython-311.so', 'locale'], sorted(os.listdir(f'{SITE_DIR}/app')))
+        self.assertEqual(['app'], os.listdir(f'{VENV_DIR}/bin'))
+        self.assertLess(os.path.getsize(f'{SITE_DIR}/app/_native.cpython-311.so'), size)
+        self.assertNotIn('.debug_info', subprocess.run(['objdump', '-h', f'{SITE_DIR}/app/_native.cpython-311.so'],
+                                                       text=True, stdout=subprocess.PIPE).stdout)
+
+        with open(REPORT_FILE) as file:
+            phases = {phase['name']: phase for phase in json.load(file)['phases']}
+
+        self.assertEqual(['bytecode', 'tests', 'docs', 'build-tools', 'debug-symbols'], list(phases))
+        self.assertEqual((1, 8), (phases['bytecode']['files'], phases['bytecode']['saved_bytes']))
+        self.assertEqual((3, 20), (phases['build-tools']['files'], phases['build-tools']['saved_bytes']))
+        self.assertEqual(1, phases['debug-symbols']['files'])
+        self.assertEqual(size - os.path.getsize(f'{SITE_DIR}/app/_native.cpython-311.so'),
+                         phases['debug-symbols']['saved_bytes'])
+        self.assertIn('Slimming rule tests: remove 1 files, 21 bytes saved', result.stderr)
+
+    def test_slim_with_configured_rules(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_slim', VENV_DIR, '-c', f'{TEST_FILE_SYSTEM_ROOT}/slim.cfg',
+                   '--rule=-debug-symbols', '--rule', 'build-tools remove bin/pip']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(['app', 'app-1.0.0.dist-info', 'pip', 'pip-24.0.dist-info'], sorted(os.listdir(SITE_DIR)))
+        self.assertEqual(['__init__.py', '_native.cpython-311.so', 'docs'], sorted(os.listdir(f'{SITE_DIR}/app')))
+        self.assertEqual(['app'], os.listdir(f'{VENV_DIR}/bin'))
+        self.assertNotIn('Slimming rule debug-symbols', result.stderr)
+        self.assertIn('Slimming rule locales: remove 1 files, 9 bytes saved', result.stderr)
+
+    def test_slim_when_rule_is_invalid(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_slim', VENV_DIR, '-c', '/dev/null', '--rule', 'docs delete */docs']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertIn("Invalid slimming rule 'docs delete */docs'", result.stderr)
+        self.assertTrue(os.path.isdir(f'{SITE_DIR}/app/docs'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import sys
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+    run_command,
+)
+
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_artifacts import ArtifactStore, get_file_hash, stage_output  # noqa: E402
+
+STORE_DIR = f'{TEST_FILE_SYSTEM_ROOT}/store'
+STORE_ARGUMENTS = ['--reproducible', '--store', '--store-dir', STORE_DIR]
+
+
+class StoreTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-project', TEST_PROJECT_ROOT, dirs_exist_ok=True)
+        print()
+
+    def commit_file(self, store, name, content):
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/staging/{name}', content)
+        package = store.commit(f'{TEST_FILE_SYSTEM_ROOT}/staging/{name}', f'{TEST_FILE_SYSTEM_ROOT}/dist')
+        return package, store.get_object_file(get_file_hash(package))
+
+    def test_identical_packages_share_the_stored_object(self):
+        # Given
+        first_dir, second_dir = f'{TEST_FILE_SYSTEM_ROOT}/first', f'{TEST_FILE_SYSTEM_ROOT}/second'
+        run_command([f'{RESOURCE_ROOT}/pack_wheel', TEST_PROJECT_ROOT, '-o', first_dir, *STORE_ARGUMENTS])
+
+        # When
+        result = run_command([f'{RESOURCE_ROOT}/pack_wheel', TEST_PROJECT_ROOT, '-o', second_dir, *STORE_ARGUMENTS])
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{second_dir}/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        first, second = os.stat(f'{first_dir}/test_project-1.0.0-py3-none-any.whl'), os.stat(result.stdout.strip())
+        self.assertEqual(first.st_ino, second.st_ino)
+        self.assertEqual(3, second.st_nlink)
+        self.assertEqual(0, second.st_mode & 0o222)
+        self.assertEqual(['test_project-1.0.0-py3-none-any.whl'], os.listdir(second_dir))
+
+    def test_repackaging_replaces_linked_package_without_changing_the_stored_object(self):
+        # Given
+        command = [f'{RESOURCE_ROOT}/pack_fpm-deb', TEST_PROJECT_ROOT, '-b', 'native']
+        package = run_command([*command, *STORE_ARGUMENTS]).stdout.strip()
+        stored = ArtifactStore(STORE_DIR).get_object_file(get_file_hash(package))
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/newFile.py', 'VALUE = 1\n')
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{package}\n', result.stdout)
+        self.assertNotEqual(os.stat(stored).st_ino, os.stat(package).st_ino)
+        self.assertEqual(stored.split('/')[-1], get_file_hash(stored))
+        self.assertEqual(1, os.stat(stored).st_nlink)
+
+    def test_staged_files_kept_in_output_directory_when_build_fails(self):
+        # Given
+        output_dir = f'{TEST_FILE_SYSTEM_ROOT}/dist'
+        create_file(f'{output_dir}/test-project-1.0.0/stale', '')
+
+        # When
+        with self.assertRaises(SystemExit):
+            with stage_output(output_dir, keep=True) as staging_dir:
+                create_file(f'{staging_dir}/test-project_1.0.0-1.dsc', 'Source: test-project\n')
+                create_file(f'{staging_dir}/test-project-1.0.0/debian/control', 'Source: test-project\n')
+                exit(2)
+
+        # Then
+        self.assertEqual(['test-project-1.0.0', 'test-project_1.0.0-1.dsc'], sorted(os.listdir(output_dir)))
+        self.assertEqual(['debian'], os.listdir(f'{output_dir}/test-project-1.0.0'))
+
+    def test_gc_removes_expired_objects_not_linked_into_output_directories(self):
+        # Given
+        store = ArtifactStore(STORE_DIR)
+        _, linked = self.commit_file(store, 'linked.deb', 'linked')
+        package, unlinked = self.commit_file(store, 'unlinked.deb', 'unlinked')
+        os.remove(package)
+
+        # When
+        removed = store.gc(max_age=0)
+
+        # Then
+        self.assertEqual([unlinked], removed)
+        self.assertTrue(os.path.exists(linked))
+
+    def test_gc_removes_unlinked_then_least_recently_linked_objects_above_max_size(self):
+        # Given
+        store = ArtifactStore(STORE_DIR)
+        _, oldest = self.commit_file(store, 'oldest.deb', 'a' * 100)
+        _, older = self.commit_file(store, 'older.deb', 'b' * 100)
+        _, newest = self.commit_file(store, 'newest.deb', 'c' * 100)
+        package, unlinked = self.commit_file(store, 'unlinked.deb', 'd' * 100)
+        os.remove(package)
+
+        # When
+        removed = store.gc(max_size=250)
+
+        # Then
+        self.assertEqual([unlinked, oldest], removed)
+        self.assertTrue(os.path.exists(older))
+        self.assertTrue(os.path.exists(newest))
+
+    def test_pack_store_gc_when_maximum_size_is_zero(self):
+        # Given
+        store = ArtifactStore(STORE_DIR)
+        self.commit_file(store, 'package.deb', 'package')
+        command = [f'{RESOURCE_ROOT}/pack_store', '-s', STORE_DIR, 'gc', '--max-size', '0']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual('0 objects, 0.0 MiB, 0 not linked into any output directory (0.0 MiB)\n', result.stdout)
+        self.assertTrue(os.path.exists(f'{TEST_FILE_SYSTEM_ROOT}/dist/package.deb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import os
 import shutil
 import subprocess
+import sys
 from pathlib import Path
 
 TEST_RESOURCE_ROOT = str(Path(os.path.dirname(__file__)).absolute())
@@ -8,6 +9,10 @@ TEST_FILE_SYSTEM_ROOT = str(Path(TEST_RESOURCE_ROOT).joinpath('test_root').absol
 TEST_PROJECT_ROOT = str(Path(TEST_FILE_SYSTEM_ROOT).joinpath('etc').joinpath('test-project').absolute())
 RESOURCE_ROOT = str(Path(TEST_RESOURCE_ROOT).parent.absolute())
 
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_verification import open_artifact  # noqa: E402
+
 
 def delete_directory(directory: str) -> None:
     if os.path.isdir(directory):
@@ -46,24 +51,10 @@ def check_files_exist(file_paths: str) -> bool:
 
 
 def check_file_is_in_deb(deb_file_path: str, file_path: str) -> bool:
-    return file_path in subprocess.run(['dpkg', '-c', deb_file_path], text=True, stdout=subprocess.PIPE).stdout
+    return file_path.lstrip('/') in open_artifact(deb_file_path).files
 
 
 def check_files_matches_in_deb(deb_file_path: str, files_and_matchers: list[tuple[str, str]]) -> bool:
-    temp_dir = f'{TEST_FILE_SYSTEM_ROOT}/tmp'
-
-    delete_directory(temp_dir)
-    os.makedirs(temp_dir)
-
-    subprocess.run(['dpkg-deb', '-e', deb_file_path, temp_dir], check=True)
-
-    all_matches = True
-
-    for file_name, matcher in files_and_matchers:
-        file_path = os.path.join(temp_dir, file_name)
-        with open(os.path.join(temp_dir, file_path), 'r') as file:
-            content = file.read()
-            matches = matcher in content
-            all_matches = all_matches and matches
+    control_files = open_artifact(deb_file_path).control_files
 
-    return all_matches
+    return all(matcher in control_files.get(file_name, '') for file_name, matcher in files_and_matchers)
@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+)
+
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_venv import VenvPool, clone_tree, clone_venv, TEMPLATE_FILE  # noqa: E402
+
+POOL_DIR = f'{TEST_FILE_SYSTEM_ROOT}/venvs'
+
+
+class VenvPoolTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        print()
+
+    def create_template(self, name, created, mtime):
+        template_dir = f'{POOL_DIR}/{name}'
+        create_file(f'{template_dir}/{TEMPLATE_FILE}', json.dumps({'created': created}))
+        os.makedirs(f'{template_dir}/venv/bin')
+        os.symlink(sys.executable, f'{template_dir}/venv/bin/python')
+        os.utime(template_dir, (mtime, mtime))
+        return template_dir
+
+    def test_template_created_once_and_reused(self):
+        # Given
+        pool = VenvPool(POOL_DIR)
+        template = pool.get_template([], 'python3')
+        with open(f'{template}/../{TEMPLATE_FILE}') as file:
+            created = json.load(file)['created']
+
+        # When
+        result = pool.get_template([], 'python3')
+
+        # Then
+        self.assertEqual(template, result)
+        self.assertTrue(os.path.exists(f'{result}/bin/python'))
+        with open(f'{result}/../{TEMPLATE_FILE}') as file:
+            self.assertEqual(created, json.load(file)['created'])
+
+    def test_template_rebuilt_when_expired(self):
+        # Given
+        pool = VenvPool(POOL_DIR, max_age=3600)
+        key = pool.get_key([], 'python3')
+        self.create_template(key, 0, 0)
+
+        # When
+        result = pool.get_template([], 'python3')
+
+        # Then
+        with open(f'{result}/../{TEMPLATE_FILE}') as file:
+            self.assertNotEqual(0, json.load(file)['created'])
+        self.assertTrue(os.path.exists(f'{result}/pyvenv.cfg'))
+
+    def test_template_created_at_its_final_path(self):
+        # Given
+        pool = VenvPool(POOL_DIR)
+
+        # When
+        template = pool.get_template([], 'python3')
+
+        # Then
+        with open(f'{template}/bin/activate') as file:
+            self.assertIn(template, file.read())
+        with open(f'{template}/bin/pip') as file:
+            self.assertEqual(f'#!{template}/bin/python3\n', file.readline())
+        self.assertEqual([], [name for name in os.listdir(POOL_DIR) if name.startswith('.tmp-')])
+
+    def test_clone_replaces_template_path_in_scripts(self):
+        # Given
+        source = f'{TEST_FILE_SYSTEM_ROOT}/template'
+        target = f'{TEST_FILE_SYSTEM_ROOT}/clone'
+        create_file(f'{source}/bin/activate', f'VIRTUAL_ENV="{source}"\n')
+        create_file(f'{source}/bin/pip', f'#!{source}/bin/python\nimport pip\n')
+        os.symlink(sys.executable, f'{source}/bin/python')
+
+        # When
+        clone_venv(source, target, '/build/debian/package/opt/venvs/package')
+
+        # Then
+        with open(f'{target}/bin/activate') as file:
+            self.assertEqual('VIRTUAL_ENV="/build/debian/package/opt/venvs/package"\n', file.read())
+        with open(f'{target}/bin/pip') as file:
+            self.assertEqual('#!/build/debian/package/opt/venvs/package/bin/python\nimport pip\n', file.read())
+        with open(f'{source}/bin/pip') as file:
+            self.assertEqual(f'#!{source}/bin/python\nimport pip\n', file.read())
+        self.assertEqual(sys.executable, os.readlink(f'{target}/bin/python'))
+
+    def test_least_recently_used_templates_evicted(self):
+        # Given
+        pool = VenvPool(POOL_DIR, size=2)
+        self.create_template('oldest', 1000, 1000)
+        self.create_template('older', 1000, 2000)
+        self.create_template('newest', 1000, 3000)
+
+        # When
+        pool.evict()
+
+        # Then
+        self.assertEqual(['newest', 'older'], sorted(os.listdir(POOL_DIR)))
+
+    def test_clone_never_hardlinks_files(self):
+        # Given
+        source = f'{TEST_FILE_SYSTEM_ROOT}/template'
+        target = f'{TEST_FILE_SYSTEM_ROOT}/clone'
+        create_file(f'{source}/lib/python3/site-packages/module.py', 'VALUE = 1\n')
+        create_file(f'{source}/lib/python3/site-packages/distutils-precedence.pth', 'import os\n')
+        create_file(f'{source}/bin/activate', 'VIRTUAL_ENV="/template"\n')
+        os.symlink('lib', f'{source}/lib64')
+
+        # When
+        clone_tree(source, target)
+
+        # Then
+        # Stripping the clone in place must not change the template
+        self.assertNotEqual(os.stat(f'{source}/lib/python3/site-packages/module.py').st_ino,
+                            os.stat(f'{target}/lib/python3/site-packages/module.py').st_ino)
+        self.assertEqual(1, os.stat(f'{source}/lib/python3/site-packages/module.py').st_nlink)
+        self.assertNotEqual(os.stat(f'{source}/bin/activate').st_ino, os.stat(f'{target}/bin/activate').st_ino)
+        self.assertNotEqual(os.stat(f'{source}/lib/python3/site-packages/distutils-precedence.pth').st_ino,
+                            os.stat(f'{target}/lib/python3/site-packages/distutils-precedence.pth').st_ino)
+        self.assertEqual('lib', os.readlink(f'{target}/lib64'))
+        with open(f'{target}/lib64/python3/site-packages/module.py') as file:
+            self.assertEqual('VALUE = 1\n', file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
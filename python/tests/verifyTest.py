@@ -0,0 +1,101 @@
+import shutil
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+    run_command,
+)
+
+NATIVE_DEB_ARGUMENTS = ['-b', 'native', '-a',
+                        '--deb-systemd service/test-project.service --after-install scripts/test-project.postinst']
+
+RULES = '''[pack-python]
+verify =
+    *.deb file usr/lib/python3/dist-packages/test_module/testFile.py
+    *.deb no-file */__pycache__/*
+    *.deb control Package = python3-test-project
+    *.deb script postinst ~ test-project successfully installed
+    *.deb unit test-project.service ~ ExecStart=
+    *.whl file test_module/testFile.py
+    *.whl control Name = test-project
+'''
+
+
+class VerifyTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-project', TEST_PROJECT_ROOT, dirs_exist_ok=True)
+        create_file(f'{TEST_FILE_SYSTEM_ROOT}/verify.cfg', RULES)
+        print()
+
+    def create_packages(self, *arguments):
+        run_command([f'{RESOURCE_ROOT}/pack_wheel', TEST_PROJECT_ROOT])
+        run_command([f'{RESOURCE_ROOT}/pack_fpm-deb', TEST_PROJECT_ROOT, *NATIVE_DEB_ARGUMENTS, *arguments])
+
+    def test_verify_when_rules_are_satisfied(self):
+        # Given
+        self.create_packages()
+        command = [f'{RESOURCE_ROOT}/pack_verify', f'{TEST_PROJECT_ROOT}/dist', '-c',
+                   f'{TEST_FILE_SYSTEM_ROOT}/verify.cfg']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n'
+                         f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+
+    def test_verify_when_data_archive_is_compressed_with_xz(self):
+        # Given
+        self.create_packages('-z', 'xz')
+        command = [f'{RESOURCE_ROOT}/pack_verify', f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb',
+                   '-c', f'{TEST_FILE_SYSTEM_ROOT}/verify.cfg']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/python3-test-project_1.0.0_all.deb\n', result.stdout)
+
+    def test_verify_when_rules_are_not_satisfied(self):
+        # Given
+        self.create_packages()
+        command = [f'{RESOURCE_ROOT}/pack_verify', f'{TEST_PROJECT_ROOT}/dist', '-c',
+                   f'{TEST_FILE_SYSTEM_ROOT}/verify.cfg', '--rule', '*.deb control Depends ~ python3-missing',
+                   '--rule', '*.deb unit other.service']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n', result.stdout)
+        self.assertIn("*.deb control Depends ~ python3-missing: control field Depends does not contain "
+                      "'python3-missing'", result.stderr)
+        self.assertIn('*.deb unit other.service: missing systemd unit other.service', result.stderr)
+
+    def test_verify_when_rule_is_invalid(self):
+        # Given
+        self.create_packages()
+        command = [f'{RESOURCE_ROOT}/pack_verify', f'{TEST_PROJECT_ROOT}/dist', '--rule', '*.deb exists usr/bin']
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(1, result.returncode)
+        self.assertEqual('', result.stdout)
+        self.assertIn("Invalid verification rule '*.deb exists usr/bin'", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
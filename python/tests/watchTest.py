@@ -0,0 +1,105 @@
+import json
+import os
+import select
+import shutil
+import subprocess
+import time
+import unittest
+import zipfile
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+)
+
+
+class WatchTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(f'{TEST_RESOURCE_ROOT}/test-project', TEST_PROJECT_ROOT, dirs_exist_ok=True)
+        print()
+
+    def start_watch(self, *arguments):
+        process = subprocess.Popen([f'{RESOURCE_ROOT}/pack_python', TEST_PROJECT_ROOT, '-s', 'wheel',
+                                    *(arguments or ['--no-cache']), '--watch', '--debounce', '0.2'],
+                                   stdout=subprocess.PIPE, text=True)
+        self.addCleanup(process.wait)
+        self.addCleanup(process.terminate)
+        return process
+
+    def read_line(self, process, timeout=60):
+        readable, _, _ = select.select([process.stdout], [], [], timeout)
+
+        if not readable:
+            self.fail('No package was created')
+
+        return process.stdout.readline()
+
+    def wait_for_report(self, report_file, condition, timeout=60):
+        # The report is written after the packages are printed
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            try:
+                with open(report_file) as file:
+                    if condition(json.load(file)):
+                        return True
+            except (OSError, ValueError):
+                pass
+
+            time.sleep(0.1)
+
+        return False
+
+    def test_watch_repackages_when_file_added(self):
+        # Given
+        process = self.start_watch()
+        wheel = self.read_line(process).strip()
+
+        # When
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/added.py', 'VALUE = 1\n')
+        second = self.read_line(process).strip()
+
+        # Then
+        self.assertEqual(f'{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl', wheel)
+        self.assertEqual(wheel, second)
+        self.assertIn('test_module/added.py', zipfile.ZipFile(second).namelist())
+
+    def test_watch_reports_cached_packages_when_workspace_restored(self):
+        # Given
+        report_file = f'{TEST_FILE_SYSTEM_ROOT}/report.json'
+        process = self.start_watch('--cache-dir', f'{TEST_FILE_SYSTEM_ROOT}/cache', '-r', report_file)
+        self.read_line(process)
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/added.py', 'VALUE = 1\n')
+        self.read_line(process)
+
+        # When
+        os.remove(f'{TEST_PROJECT_ROOT}/test_module/added.py')
+        self.read_line(process)
+
+        # Then
+        self.assertTrue(self.wait_for_report(report_file, lambda report: report['phases'][0]['cached']))
+
+    def test_watch_repackages_when_file_removed(self):
+        # Given
+        create_file(f'{TEST_PROJECT_ROOT}/test_module/removed.py', 'VALUE = 1\n')
+        process = self.start_watch()
+        wheel = self.read_line(process).strip()
+        self.assertIn('test_module/removed.py', zipfile.ZipFile(wheel).namelist())
+
+        # When
+        os.remove(f'{TEST_PROJECT_ROOT}/test_module/removed.py')
+        second = self.read_line(process).strip()
+
+        # Then
+        self.assertNotIn('test_module/removed.py', zipfile.ZipFile(second).namelist())
+
+
+if __name__ == '__main__':
+    unittest.main()
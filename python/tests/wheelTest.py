@@ -1,5 +1,9 @@
+import hashlib
+import json
 import os
 import shutil
+import sys
+import time
 import unittest
 from unittest import TestCase
 
@@ -13,6 +17,10 @@ from utils import (
     check_files_exist,
 )
 
+sys.path.insert(0, RESOURCE_ROOT)
+
+from pack_common import load_script  # noqa: E402
+
 
 class WheelTest(TestCase):
 
@@ -78,6 +86,78 @@ class WheelTest(TestCase):
         )
         self.assertTrue(check_files_exist(result.stdout))
 
+    def test_wheel_when_report_specified(self):
+        # Given
+        report_file = f"{TEST_FILE_SYSTEM_ROOT}/report.json"
+        command = [f"{RESOURCE_ROOT}/pack_wheel", TEST_PROJECT_ROOT, "-r", report_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        with open(report_file) as file:
+            report = json.load(file)
+        self.assertEqual("wheel", report["name"])
+        self.assertEqual(["bdist_wheel"], [phase["name"] for phase in report["phases"]])
+        self.assertGreater(report["phases"][0]["wall_time"], 0)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl",
+            report["artifacts"][0]["path"],
+        )
+        self.assertEqual(
+            os.path.getsize(f"{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl"),
+            report["artifacts"][0]["size"],
+        )
+        self.assertGreater(report["output_bytes"], 0)
+
+    def test_wheel_when_log_file_specified(self):
+        # Given
+        log_file = f"{TEST_FILE_SYSTEM_ROOT}/wheel.log"
+        command = [f"{RESOURCE_ROOT}/pack_wheel", TEST_PROJECT_ROOT, "-l", log_file]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            f"{TEST_PROJECT_ROOT}/dist/test_project-1.0.0-py3-none-any.whl\n",
+            result.stdout,
+        )
+        self.assertNotIn("adding 'test_module/testFile.py'", result.stderr)
+        with open(log_file) as file:
+            self.assertIn("adding 'test_module/testFile.py'", file.read())
+
+    def test_wheel_when_reproducible_specified(self):
+        # Given
+        command = [f"{RESOURCE_ROOT}/pack_wheel", TEST_PROJECT_ROOT, "--reproducible"]
+        wheel_file = run_command(command).stdout.strip()
+        with open(wheel_file, "rb") as file:
+            first_hash = hashlib.sha256(file.read()).hexdigest()
+        delete_directory(f"{TEST_PROJECT_ROOT}/dist")
+        delete_directory(f"{TEST_PROJECT_ROOT}/build")
+        time.sleep(1)
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        with open(wheel_file, "rb") as file:
+            self.assertEqual(first_hash, hashlib.sha256(file.read()).hexdigest())
+
+    def test_wheel_when_packaged_in_process(self):
+        # Given
+        script = load_script(f"{RESOURCE_ROOT}/pack_wheel")
+
+        # When
+        result = script.package(TEST_PROJECT_ROOT, ["-o", f"{TEST_FILE_SYSTEM_ROOT}/dist"])
+
+        # Then
+        self.assertEqual([f"{TEST_FILE_SYSTEM_ROOT}/dist/test_project-1.0.0-py3-none-any.whl"], result)
+        self.assertTrue(check_files_exist("\n".join(result)))
+
     def test_propagates_return_code_of_command(self):
         # Given
         command = [
@@ -0,0 +1,79 @@
+import os
+import shutil
+import unittest
+from unittest import TestCase
+
+from utils import (
+    TEST_PROJECT_ROOT,
+    TEST_RESOURCE_ROOT,
+    TEST_FILE_SYSTEM_ROOT,
+    RESOURCE_ROOT,
+    delete_directory,
+    create_file,
+    run_command,
+)
+
+
+class WheelhouseTest(TestCase):
+
+    def setUp(self):
+        delete_directory(TEST_FILE_SYSTEM_ROOT)
+        shutil.copytree(
+            f"{TEST_RESOURCE_ROOT}/test-project", TEST_PROJECT_ROOT, dirs_exist_ok=True
+        )
+        print()
+
+    def test_wheelhouse_warm_builds_dependency_wheels(self):
+        # Given
+        wheelhouse = f"{TEST_FILE_SYSTEM_ROOT}/wheelhouse"
+        command = [
+            f"{RESOURCE_ROOT}/pack_wheelhouse",
+            "-w",
+            wheelhouse,
+            "warm",
+            TEST_PROJECT_ROOT,
+        ]
+
+        # When
+        result = run_command(command)
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        wheelhouse_dir = result.stdout.strip()
+        self.assertTrue(wheelhouse_dir.startswith(f"{wheelhouse}/cp3"))
+        wheels = os.listdir(wheelhouse_dir)
+        self.assertTrue(any(wheel.startswith("python_context_logger-") for wheel in wheels))
+        self.assertTrue(any(wheel.startswith("pip-") for wheel in wheels))
+        self.assertFalse(any(wheel.startswith("test_project-") for wheel in wheels))
+
+    def test_wheelhouse_prune_removes_unused_wheels(self):
+        # Given
+        wheelhouse = f"{TEST_FILE_SYSTEM_ROOT}/wheelhouse"
+        wheelhouse_dir = run_command(
+            [f"{RESOURCE_ROOT}/pack_wheelhouse", "-w", wheelhouse, "prune"]
+        ).stdout.strip()
+        create_file(f"{wheelhouse_dir}/numpy-1.0.0-cp311-cp311-linux_x86_64.whl", "old")
+        os.utime(f"{wheelhouse_dir}/numpy-1.0.0-cp311-cp311-linux_x86_64.whl", (0, 0))
+        create_file(f"{wheelhouse_dir}/numpy-1.5.0-cp311-cp311-linux_x86_64.whl", "pinned")
+        create_file(f"{wheelhouse_dir}/numpy-2.0.0-cp311-cp311-linux_x86_64.whl", "new")
+        create_file(f"{wheelhouse_dir}/pip-24.0-py3-none-any.whl", "pip")
+
+        # When
+        result = run_command(
+            [f"{RESOURCE_ROOT}/pack_wheelhouse", "-w", wheelhouse, "prune"]
+        )
+
+        # Then
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(
+            [
+                "numpy-1.5.0-cp311-cp311-linux_x86_64.whl",
+                "numpy-2.0.0-cp311-cp311-linux_x86_64.whl",
+                "pip-24.0-py3-none-any.whl",
+            ],
+            sorted(os.listdir(wheelhouse_dir)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()